@@ -1,211 +1,386 @@
 import json, boto3, datetime
+from concurrent.futures import ThreadPoolExecutor
 from zoneinfo import ZoneInfo
-from bisect import bisect_left
+import numpy as np
+from wind_common import dailymetrics, manifest, metrics, rollups, s3util, scatter
+from wind_common.columnar import read_columns
+from wind_common.forecast import ENTRY_PATHS, KMH_TO_KNOTS, parse_entries, window, interpolate, nearest
+from wind_common.jsonstream import load_paths
+from wind_common.timeslice import day_window, slice_points
+import procpool
 
 s3 = boto3.client("s3")
+WIND_POINTS_PATH = "observationalGraphs.wind.dataConfig.series.groups[0].points"
+GUST_POINTS_PATH = "observationalGraphs.wind-gust.dataConfig.series.groups[0].points"
+OBSERVATION_COLUMNS = ["wind.x", "wind.y", "wind.direction", "wind-gust.x", "wind-gust.y"]
+BRIS = ZoneInfo("Australia/Brisbane")
+
+RECORD_BUCKET = "record-wind"
+FORECAST_BUCKET = "forecast-wind"
+ANALYSIS_BUCKET = "analysis-wind"
+
+# stations with a forecast of their own; record_wind only stores the Gold
+# Coast forecast, and scoring the other stations against it would publish
+# accuracy for places it does not describe
+STATIONS = ["GC"]
+STATION_NAMES = {"GC": "Gold Coast Seaway"}
+FORECAST_PREFIX = "GC"
+UNIT = "knots"
+MAX_WORKERS = 8
+
+# rebuild mode: days analysed per chunk, and time kept back to finish writing
+REBUILD_CHUNK_DAYS = 31
+REBUILD_RESERVE_MS = 30000
+
 
 def lambda_handler(event, context):
-    bris = ZoneInfo("Australia/Brisbane")
-    now_bris = datetime.datetime.now(bris)
+    """
+    Yesterday's forecast-vs-actual analysis and daily metrics for each
+    station, or for event {"stations": [...]}.
+    """
+    if (event or {}).get("mode") == "rebuild":
+        return rebuild(event, context)
 
+    now_bris = datetime.datetime.now(BRIS)
     yesterday = (now_bris - datetime.timedelta(days=1)).date()
     ydate = yesterday.strftime("%Y-%m-%d")
-    yprefix = f"GC{ydate}"
-
-    record_bucket   = "record-wind"
-    forecast_bucket = "forecast-wind"
-    analysis_bucket = "analysis-wind"
-
-    # read actual data
-    record_key = f"{yprefix}.json"
-    record_obj = s3.get_object(Bucket=record_bucket, Key=record_key)
-    record_raw = json.loads(record_obj["Body"].read())
-    actual_points = record_raw["observationalGraphs"]["wind"]["dataConfig"]["series"]["groups"][0]["points"]
-
-    # read forecast dat
-    forecast_key = f"{yprefix}.json"
-    forecast_obj = s3.get_object(Bucket=forecast_bucket, Key=forecast_key)
-    forecast_raw = json.loads(forecast_obj["Body"].read())
-
-    start_bris = datetime.datetime(yesterday.year, yesterday.month, yesterday.day, 0, 0, 0, tzinfo=bris)
-    end_bris   = start_bris + datetime.timedelta(days=1)
-
-    # collect forecast entries 
-    raw_entries = []
-    for day in forecast_raw["forecasts"]["wind"]["days"]:
-        for e in day["entries"]:
-            ts = datetime.datetime.fromisoformat(e["dateTime"])
-            if ts.tzinfo is None:
-                ts = ts.replace(tzinfo=bris)
-            else:
-                ts = ts.astimezone(bris)
-            if start_bris <= ts < end_bris:
-                raw_entries.append({
-                    "ts": ts,
-                    "wind_knots": e["speed"] * 0.539957  # km/h → knots
-                })
-    raw_entries.sort(key=lambda p: p["ts"])
-
-    # interpolate forecast to 10 min steps
-    forecast_points = []
-    for a, b in zip(raw_entries, raw_entries[1:]):
-        forecast_points.append({"ts": a["ts"], "wind_knots": a["wind_knots"]})
-        t = a["ts"]
-        while (t + datetime.timedelta(minutes=10)) < b["ts"]:
-            t += datetime.timedelta(minutes=10)
-            frac = (t - a["ts"]).total_seconds() / (b["ts"] - a["ts"]).total_seconds()
-            interp_val = a["wind_knots"] + frac * (b["wind_knots"] - a["wind_knots"])
-            forecast_points.append({"ts": t, "wind_knots": interp_val})
-    if raw_entries:
-        forecast_points.append(raw_entries[-1])
-
-    forecast_times = [f["ts"] for f in forecast_points]
-    forecast_knots = [f["wind_knots"] for f in forecast_points]
-
-    def find_nearest_forecast(ts):
-        if not forecast_times:
-            return None
-        i = bisect_left(forecast_times, ts)
-        if i == 0:
-            return forecast_knots[0]
-        if i == len(forecast_times):
-            return forecast_knots[-1]
-        before, after = forecast_times[i-1], forecast_times[i]
-        if abs((ts - before).total_seconds()) <= abs((after - ts).total_seconds()):
-            return forecast_knots[i-1]
-        return forecast_knots[i]
-
-    # Merge 
-    merged = []
-    for p in actual_points:
-        # treat as already Brisbane local 
-        ts = datetime.datetime.utcfromtimestamp(p["x"]).replace(tzinfo=bris)
-        if not (start_bris <= ts < end_bris):
+    stations = (event or {}).get("stations") or STATIONS
+
+    # I/O on threads: the forecast once, then every station's actuals
+    forecast = load_forecast_grid(FORECAST_PREFIX, yesterday)
+    actuals, errors = fetch_actuals(stations, ydate)
+
+    # merge and metrics; one day per station is too little for procpool to fork
+    analysed, failed = procpool.run(
+        lambda station: analyse_day(actuals[station], ydate, forecast),
+        list(actuals)
+    )
+    errors.update(failed)
+
+    # writes back on threads, one station per task
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        futures = {
+            station: pool.submit(store_day, station, yesterday, result, now_bris)
+            for station, result in analysed.items()
+        }
+    for station, fut in futures.items():
+        try:
+            fut.result()
+        except Exception as e:
+            errors[station] = str(e)
+
+    if errors:
+        # raise rather than return, so the scheduled (async) invocation is retried and counted as failed
+        raise RuntimeError(f"analysis_builder finished with errors: {json.dumps(errors)}")
+    return {"statusCode": 200, "body": f"analysis {ydate} saved for {', '.join(sorted(analysed))}"}
+
+
+def rebuild(event, context):
+    """
+    {"mode": "rebuild", "start": "2025-01-01", "end": "2025-12-31", "stations": [...], "force": false}
+
+    Recomputes every station-day in [start, end] (end defaults to yesterday)
+    that has record and forecast objects but no analysis, an analysis older
+    than its inputs, or no daily metrics record; force=true recomputes them
+    all, e.g. after changing the metrics. Days go in chunks: inputs are read
+    on threads, merged on worker processes, and each chunk's analysis files,
+    manifests and rollups are written together. Daily metrics are written at
+    the end and compacted once per station-year. Stops before the Lambda
+    times out and returns where to resume.
+    """
+    now_bris = datetime.datetime.now(BRIS)
+    if not event.get("start"):
+        return {"statusCode": 400, "body": json.dumps("rebuild needs a start date")}
+    start = datetime.date.fromisoformat(event["start"])
+    end = datetime.date.fromisoformat(event.get("end") or str(now_bris.date() - datetime.timedelta(days=1)))
+    stations = event.get("stations") or STATIONS
+
+    todo = find_stale_days(stations, start, end, force=event.get("force", False))
+    dates = sorted({d for _, d in todo})
+    print(f"rebuild {start}..{end}: {len(todo)} station-days over {len(dates)} days")
+
+    metric_entries, errors, resume = [], {}, None
+    for i in range(0, len(dates), REBUILD_CHUNK_DAYS):
+        if context is not None and context.get_remaining_time_in_millis() < REBUILD_RESERVE_MS:
+            resume = dates[i]
+            break
+        chunk = set(dates[i:i + REBUILD_CHUNK_DAYS])
+        chunk_metrics, chunk_errors = rebuild_chunk([item for item in todo if item[1] in chunk], now_bris)
+        metric_entries.extend(chunk_metrics)
+        errors.update(chunk_errors)
+
+    errors.update(store_daily_metrics_bulk(metric_entries, now_bris))
+
+    body = {"rebuilt": len(metric_entries), "errors": {f"{st}{d}": e for (st, d), e in errors.items()}}
+    if resume:
+        body["resume"] = {"mode": "rebuild", "start": resume, "end": str(end), "stations": stations, "force": event.get("force", False)}
+    return {"statusCode": 500 if errors else 200, "body": json.dumps(body)}
+
+
+def find_stale_days(stations, start, end, force=False):
+    """Sorted [(station, date_str)] with inputs but missing or out of date outputs."""
+    forecasts = list_days(FORECAST_BUCKET, FORECAST_PREFIX, start, end)
+    todo = []
+    for station in stations:
+        records = list_days(RECORD_BUCKET, station, start, end)
+        analyses = list_days(ANALYSIS_BUCKET, station, start, end)
+        metric_days = list_days(ANALYSIS_BUCKET, f"{station}metrics/", start, end)
+        for date_str, record_modified in records.items():
+            if date_str not in forecasts:
+                continue
+            analysis_modified = analyses.get(date_str)
+            stale = analysis_modified is None or analysis_modified < max(record_modified, forecasts[date_str])
+            if force or stale or date_str not in metric_days:
+                todo.append((station, date_str))
+    return sorted(todo)
+
+
+def list_days(bucket, prefix, start, end):
+    """{date_str: LastModified} of <prefix>YYYY-MM-DD.json objects in [start, end]."""
+    return {date_str: obj["LastModified"] for date_str, obj in s3util.list_dated(s3, bucket, prefix, start, end)}
+
+
+def rebuild_chunk(items, now_bris):
+    """Analyse and write [(station, date_str)]; returns (metrics entries with station, errors)."""
+    errors = {}
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        grid_futures = {d: pool.submit(load_forecast_grid, FORECAST_PREFIX, datetime.date.fromisoformat(d)) for d in {d for _, d in items}}
+        actual_futures = {item: pool.submit(load_observations, RECORD_BUCKET, f"{item[0]}{item[1]}") for item in items}
+    grids, actuals = {}, {}
+    for d, fut in grid_futures.items():
+        try:
+            grids[d] = fut.result()
+        except Exception as e:
+            errors.update({item: f"forecast: {e}" for item in items if item[1] == d})
+    for item, fut in actual_futures.items():
+        try:
+            if item[1] in grids:
+                actuals[item] = fut.result()
+        except Exception as e:
+            errors[item] = f"record: {e}"
+
+    analysed, failed = procpool.run(
+        lambda item: analyse_day(actuals[item], item[1], grids[item[1]]),
+        list(actuals)
+    )
+    errors.update(failed)
+
+    # analysis files on threads, then one manifest and rollup write per station
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        entry_futures = {
+            item: pool.submit(write_analysis, item[0], item[1], result["merged"])
+            for item, result in analysed.items()
+        }
+    written = {}
+    for item, fut in entry_futures.items():
+        try:
+            written.setdefault(item[0], {})[item[1]] = fut.result()
+        except Exception as e:
+            errors[item] = str(e)
+
+    # a station that fails here gets no metrics record, so the next rebuild picks its days up again
+    metric_entries = []
+    for station, entries in written.items():
+        name = STATION_NAMES.get(station, station)
+        try:
+            manifest.record_days(s3, ANALYSIS_BUCKET, station, entries)
+            days = {datetime.date.fromisoformat(d): analysed[(station, d)]["merged"] for d in entries}
+            update_rollups(days, ANALYSIS_BUCKET, name, UNIT, now_bris, prefix=station)
+        except Exception as e:
+            errors.update({(station, d): f"manifest/rollups: {e}" for d in entries})
             continue
+        metric_entries.extend((station, analysed[(station, d)]["metrics"]) for d in entries)
+    return metric_entries, errors
+
+
+def store_daily_metrics_bulk(metric_entries, now_bris, model_id="willyweather"):
+    """Write [(station, entry)] day records in parallel, then compact each station-year once."""
+    errors = {}
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        futures = {
+            (station, entry["date"]): pool.submit(dailymetrics.put_day, s3, ANALYSIS_BUCKET, station, entry)
+            for station, entry in metric_entries
+        }
+    for item, fut in futures.items():
+        try:
+            fut.result()
+        except Exception as e:
+            errors[item] = f"metrics: {e}"
+
+    for station, year in sorted({(st, int(entry["date"][:4])) for st, entry in metric_entries}):
+        name = STATION_NAMES.get(station, station)
+        try:
+            dailymetrics.compact(s3, ANALYSIS_BUCKET, station, year, name, UNIT, now_bris, model_id)
+        except Exception as e:
+            errors[(station, str(year))] = f"compact: {e}"
+    return errors
+
+
+def load_forecast_grid(prefix, day):
+    """The forecast for `day` on the 10 min grid: {"times", "knots", "gust_knots"}."""
+    forecast_obj = s3.get_object(Bucket=FORECAST_BUCKET, Key=f"{prefix}{day}.json")
+    forecast_raw = load_paths(forecast_obj["Body"], ENTRY_PATHS)
+
+    times, knots, _, _ = parse_entries(forecast_raw, BRIS)
+    _, gusts, _, _ = parse_entries(forecast_raw, BRIS, speed_field="gustSpeed")
+    w = window(times, *day_window(day))
+    grid, grid_knots = interpolate(times[w], knots[w])
+    _, grid_gusts = interpolate(times[w], gusts[w])
+    return {"times": grid, "knots": grid_knots, "gust_knots": grid_gusts}
+
+
+def fetch_actuals(stations, date_str):
+    """({station: observations}, {station: error}) read in parallel."""
+    actuals, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        futures = {st: pool.submit(load_observations, RECORD_BUCKET, f"{st}{date_str}") for st in stations}
+    for station, fut in futures.items():
+        try:
+            actuals[station] = fut.result()
+        except Exception as e:
+            errors[station] = f"no record for {date_str}: {e}"
+    return actuals, errors
+
+
+def analyse_day(observations, date_str, forecast):
+    """Forecast-vs-actual rows and daily metrics for one station-day (CPU only, no S3)."""
+    start, end = day_window(datetime.date.fromisoformat(date_str))
+    actual_points = slice_points(observations["wind"], start, end)
+    predicted = nearest(forecast["times"], forecast["knots"], [p["x"] for p in actual_points])
+    gust_points = slice_points(observations["gust"], start, end)
+    gust_predicted = nearest(forecast["times"], forecast["gust_knots"], [p["x"] for p in gust_points])
+
+    merged = []
+    for p, pred in zip(actual_points, predicted):
+        # treat as already Brisbane local
+        ts = datetime.datetime.utcfromtimestamp(p["x"]).replace(tzinfo=BRIS)
         merged.append({
             "time": ts.isoformat(),        # full ISO timestamp with timezone
-            "actual": p["y"] * 0.539957,   #  knots
-            "predicted": find_nearest_forecast(ts)
+            "actual": p["y"] * KMH_TO_KNOTS,   #  knots
+            "predicted": pred
         })
+    return {"merged": merged, "metrics": daily_metrics(date_str, actual_points, predicted, gust_points, gust_predicted)}
+
 
-    # save
+def store_day(station, day, result, now_bris):
+    """Write one station-day: analysis file, manifest, rollups and daily metrics."""
+    name = STATION_NAMES.get(station, station)
+    manifest.record_days(s3, ANALYSIS_BUCKET, station, {str(day): write_analysis(station, day, result["merged"])})
+
+    # month / year rollups for long range queries
+    update_rollups({day: result["merged"]}, ANALYSIS_BUCKET, name, UNIT, now_bris, prefix=station)
+
+    store_daily_metrics(result["metrics"], s3, ANALYSIS_BUCKET, name, UNIT, now_bris, prefix=station)
+
+
+def write_analysis(station, day, merged):
+    """Put one station-day's analysis file; returns its manifest entry."""
     out = {
         "metadata": {
-            "station": "Gold Coast Seaway",
-            "unit": "knots",
-            "date": ydate
+            "station": STATION_NAMES.get(station, station),
+            "unit": UNIT,
+            "date": str(day)
         },
-        "data": merged
+        "data": merged,
+        "scatter": scatter.histogram(merged)
     }
 
-    out_key = f"{yprefix}.json"
-    s3.put_object(
-        Bucket=analysis_bucket,
-        Key=out_key,
-        Body=json.dumps(out),
+    body = json.dumps(out)
+    resp = s3.put_object(
+        Bucket=ANALYSIS_BUCKET,
+        Key=f"{station}{day}.json",
+        Body=body,
         ContentType="application/json"
     )
+    return manifest.day_entry(resp, body, len(merged))
 
-    # daily metrics file creation
-    upsert_daily_metrics_from_merged(
-        merged=merged,
-        ydate=ydate,
-        s3_client=s3,
-        bucket=analysis_bucket,
-        station=out["metadata"]["station"],
-        unit=out["metadata"]["unit"],
-        now_bris=now_bris,
-    )
 
-    return {"statusCode": 200, "body": f"analysis {out_key} saved"}
+def update_rollups(days, bucket, station, unit, now_bris, prefix="GC"):
+    """Put each day's rows ({date: merged}) into the month and year rollups, one write per rollup."""
+    periods = {}
+    for day, merged in days.items():
+        for tier, period in rollups.periods_for(day):
+            periods.setdefault((tier, period), {})[str(day)] = merged
+
+    # conditional read-modify-write, so a daily run and a rebuild cannot drop each other's days
+    for (tier, period), period_days in periods.items():
+        s3util.update_json(
+            s3, bucket, rollups.rollup_key(prefix, tier, period),
+            lambda existing: rollups.update_days(existing, period_days, station, unit, tier, period, now_bris)
+        )
+
+
+def load_observations(record_bucket, yprefix):
+    """
+    {"wind": [{"x", "y", "direction"}], "gust": [{"x", "y"}]} for one
+    station-day. Reads just those columns of the compact .cols object,
+    falling back to the raw JSON for older days.
+    """
+    try:
+        cols = read_columns(s3, record_bucket, f"{yprefix}.cols", OBSERVATION_COLUMNS)
+    except s3.exceptions.NoSuchKey:
+        cols = {}
+    if cols:
+        directions = cols.get("wind.direction") or [None] * len(cols["wind.x"])
+        return {
+            "wind": [
+                {"x": x, "y": y, "direction": d}
+                for x, y, d in zip(cols["wind.x"], cols["wind.y"], directions)
+                if y == y  # drop NaN gaps
+            ],
+            "gust": [
+                {"x": x, "y": y}
+                for x, y in zip(cols.get("wind-gust.x", []), cols.get("wind-gust.y", []))
+                if y == y
+            ],
+        }
+
+    record_obj = s3.get_object(Bucket=record_bucket, Key=f"{yprefix}.json")
+    graphs = load_paths(record_obj["Body"], [WIND_POINTS_PATH, GUST_POINTS_PATH])["observationalGraphs"]
+    return {
+        "wind": graphs["wind"]["dataConfig"]["series"]["groups"][0]["points"],
+        "gust": graphs.get("wind-gust", {}).get("dataConfig", {}).get("series", {}).get("groups", [{}])[0].get("points", []),
+    }
 
 # daily metrics analysis
-def upsert_daily_metrics_from_merged(
-    merged: list,
-    ydate: str,
+def daily_metrics(ydate, actual_points, predicted, gust_points=(), gust_predicted=()):
+    """
+    Daily metrics for matched observations (km/h points) and predictions
+    (knots), plus gust metrics and breakdowns by hour, speed band and
+    direction sector, all on NumPy (see wind_common.metrics).
+    """
+    actual = np.array([p["y"] for p in actual_points], dtype=np.float64) * KMH_TO_KNOTS
+    gust_actual = np.array([p["y"] for p in gust_points], dtype=np.float64) * KMH_TO_KNOTS
+
+    daily_entry = {"date": ydate}
+    daily_entry.update(metrics.summary(actual, predicted))
+    daily_entry["gust"] = metrics.summary(gust_actual, gust_predicted)
+    daily_entry["by_hour"] = metrics.by_hour(actual, predicted, [p["x"] for p in actual_points])
+    daily_entry["by_speed"] = metrics.by_speed_band(actual, predicted)
+    daily_entry["by_direction"] = metrics.by_sector(actual, predicted, [p.get("direction") for p in actual_points])
+    return daily_entry
+
+
+def store_daily_metrics(
+    daily_entry: dict,
     s3_client,
     bucket: str,
     station: str,
     unit: str,
     now_bris,              # datetime in Brisbane tz (for updated_at)
     model_id: str = "willyweather",
-    expected_slots: int = 144,
+    prefix: str = "GC",
 ):
     """
-    Compute daily metrics from the in-memory `merged` 10-min pairs and
-    upsert into analysis bucket as GCdaily.json.
+    Store a day's metrics as its own record in the analysis bucket (see
+    wind_common.dailymetrics) and fold it into the year partition.
     """
-    EPS = 1e-6
-
-    # collect valid pairs
-    pairs = []
-    for row in merged:
-        a = row.get("actual")
-        p = row.get("predicted")
-        if isinstance(a, (int, float)) and isinstance(p, (int, float)):
-            pairs.append((float(a), float(p)))
-
-    n = len(pairs)
-    if n > 0:
-        abs_err = [abs(a - p) for a, p in pairs]
-        sq_err  = [(a - p) ** 2 for a, p in pairs]
-        bias_v  = [p - a for a, p in pairs]
-        smape_v = [2 * abs(a - p) / (abs(a) + abs(p) + EPS) for a, p in pairs]
-        mean_a  = sum(a for a, _ in pairs) / n
-        mean_p  = sum(p for _, p in pairs) / n
-
-        daily_entry = {
-            "date": ydate,
-            "n": n,
-            "coverage": n / float(expected_slots),
-            "mae": sum(abs_err) / n,
-            "rmse": (sum(sq_err) / n) ** 0.5,
-            "bias": sum(bias_v) / n,
-            "smape": sum(smape_v) / n,
-            "mean_actual": mean_a,
-            "mean_predicted": mean_p,
-        }
-    else:
-        daily_entry = {
-            "date": ydate, "n": 0, "coverage": 0.0,
-            "mae": None, "rmse": None, "bias": None, "smape": None,
-            "mean_actual": None, "mean_predicted": None,
-        }
-
-    # Load existing GCdaily.json 
-    daily_key = "GCdaily.json"
-    try:
-        existing = s3_client.get_object(Bucket=bucket, Key=daily_key)
-        daily_obj = json.loads(existing["Body"].read())
-    except Exception:
-        daily_obj = {
-            "station": station,
-            "unit": unit,
-            "model_id": model_id,
-            "daily": []
-        }
-
-    # Upsert yesterdays entry
-    daily_list = [d for d in daily_obj.get("daily", []) if d.get("date") != ydate]
-    daily_list.append(daily_entry)
-    daily_list.sort(key=lambda d: d["date"])  # keep ascending order
-
-    daily_obj["station"] = daily_obj.get("station", station)
-    daily_obj["unit"] = daily_obj.get("unit", unit)
-    daily_obj["model_id"] = daily_obj.get("model_id", model_id)
-    daily_obj["daily"] = daily_list
-    daily_obj["updated_at"] = now_bris.isoformat()
-
-    # Save back
-    s3_client.put_object(
-        Bucket=bucket,
-        Key=daily_key,
-        Body=json.dumps(daily_obj),
-        ContentType="application/json"
-    )
+    ydate = daily_entry["date"]
+    dailymetrics.put_day(s3_client, bucket, prefix, daily_entry)
+    dailymetrics.compact(s3_client, bucket, prefix, int(ydate[:4]), station, unit, now_bris, model_id)
 
     print(
-        f"Daily metrics upserted for {ydate}: "
+        f"Daily metrics recorded for {prefix} {ydate}: "
         f"n={daily_entry['n']}, coverage={daily_entry['coverage']:.3f}, "
         f"mae={daily_entry['mae']}, rmse={daily_entry['rmse']}, "
         f"bias={daily_entry['bias']}, smape={daily_entry['smape']}"
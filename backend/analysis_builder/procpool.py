@@ -0,0 +1,87 @@
+"""
+Process-parallel map that works inside Lambda.
+
+multiprocessing.Pool and ProcessPoolExecutor need /dev/shm for their
+semaphores, which Lambda does not provide, so this forks plain Processes
+and sends results back over Pipes. Items are dealt out into one chunk per
+process. Forked children inherit the parent's memory, so `func` can read
+large inputs (forecast grids, actuals) without pickling them; only the
+results travel back.
+
+Lambda's os.cpu_count() reports 2 whatever the memory size, but a full
+vCPU only comes with every 1769 MB, so the process count follows the
+function's memory. A fork only pays off with enough work behind it, so
+each process gets at least MIN_ITEMS_PER_PROCESS items; the daily run
+(one day per station) stays in-process.
+"""
+import multiprocessing, os, traceback
+
+MB_PER_VCPU = 1769
+MIN_ITEMS_PER_PROCESS = 16
+
+
+def _default_processes():
+    if "ANALYSIS_PROCESSES" in os.environ:
+        return int(os.environ["ANALYSIS_PROCESSES"])
+    cpus = os.cpu_count() or 1
+    memory = os.environ.get("AWS_LAMBDA_FUNCTION_MEMORY_SIZE")
+    if memory:
+        cpus = min(cpus, int(memory) // MB_PER_VCPU)
+    return max(1, cpus)
+
+
+PROCESSES = _default_processes()
+
+
+def run(func, items, processes=PROCESSES):
+    """
+    Call func(item) for every item across worker processes.
+    Returns ({item: result}, {item: error message}) like record_wind's
+    run_jobs, so one broken item never loses the others.
+    """
+    items = list(items)
+    processes = max(1, min(processes, len(items) // MIN_ITEMS_PER_PROCESS))
+    if processes == 1:
+        return _call_all(func, items)
+
+    ctx = multiprocessing.get_context("fork")
+    workers = []
+    for k in range(processes):
+        chunk = items[k::processes]
+        recv, send = ctx.Pipe(duplex=False)
+        proc = ctx.Process(target=_work, args=(func, chunk, send))
+        proc.start()
+        send.close()
+        workers.append((proc, recv, chunk))
+
+    results, errors = {}, {}
+    for proc, recv, chunk in workers:
+        try:
+            chunk_results, chunk_errors = recv.recv()   # before join, a full pipe would block the child
+            results.update(chunk_results)
+            errors.update(chunk_errors)
+        except EOFError:   # died before replying, e.g. out of memory
+            proc.join()
+            errors.update({item: f"worker exited with code {proc.exitcode}" for item in chunk})
+        finally:
+            recv.close()
+            proc.join()
+    return results, errors
+
+
+def _call_all(func, items):
+    results, errors = {}, {}
+    for item in items:
+        try:
+            results[item] = func(item)
+        except Exception as e:
+            traceback.print_exc()
+            errors[item] = str(e)
+    return results, errors
+
+
+def _work(func, chunk, conn):
+    try:
+        conn.send(_call_all(func, chunk))
+    finally:
+        conn.close()
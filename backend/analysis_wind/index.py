@@ -1,111 +1,305 @@
-import json
 import boto3
-import re
-from datetime import datetime
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+from wind_common import dailymetrics, manifest, rollups, s3util, scatter, wire
+from wind_common.downsample import downsample_rows
+from wind_common.responses import error, respond, seconds_until_next
+from wind_common.s3cache import ObjectCache
 
 s3 = boto3.client("s3")
 ANALYSIS_BUCKET = "analysis-wind"
 
+MAX_WORKERS = 16
+SCATTER_POINTS = 2000
+# all mode=hist reads of a day file or rollup; the 10 min rows are skipped unparsed
+HIST_PATHS = ("scatter",)
+MAX_SCATTER_POINTS = 10000
+# daily metrics the bar graph can return, selectable with fields=
+METRIC_FIELDS = ("n", "coverage", "mae", "rmse", "bias", "smape", "mean_actual", "mean_predicted")
+# nested gust metrics and breakdowns, only returned when asked for by name
+BREAKDOWN_FIELDS = ("gust", "by_hour", "by_speed", "by_direction")
+# ranges that end before yesterday never change again
+HISTORY_MAX_AGE = 86400
+
+# lives as long as the container, so warm invocations skip downloading unchanged days
+cache = ObjectCache(s3)
+
 def lambda_handler(event, context):
     params = event.get("queryStringParameters") or {}
     graph_type = params.get("type", "line")
 
 
     if graph_type == "line":
-        return build_line_graph(params)
+        return build_line_graph(params, event)
     elif graph_type == "bar":
-        return build_bar_graph(params)
+        return build_bar_graph(params, event)
     elif graph_type == "scatter":
-        print("Scatter graph not implemented yet")
-        return _empty_response()
+        return build_scatter_graph(params, event)
     else:
-        return _error_response(f"Unknown graph type: {graph_type}")
+        return _error_response(event, f"Unknown graph type: {graph_type}")
 
 
-def build_line_graph(params):
+def build_line_graph(params, event):
     start_str = params.get("start")
     end_str = params.get("end")
   
     start_date = datetime.strptime(start_str, "%Y-%m-%d").date() if start_str else None
     end_date = datetime.strptime(end_str, "%Y-%m-%d").date() if end_str else None
 
-    resp = s3.list_objects_v2(Bucket=ANALYSIS_BUCKET)
-    if "Contents" not in resp:
-        print("No files found in bucket")
-        return _empty_response()
-
-    all_data = []
-    dates = []
+    today = datetime.now(ZoneInfo("Australia/Brisbane")).date()
 
+    resolution = params.get("resolution", "10min")
+    if resolution not in ("10min", "hour", "day"):
+        return _error_response(event, f"Unknown resolution: {resolution}")
+    try:
+        max_points = int(params.get("max_points", 0))
+    except ValueError:
+        return _error_response(event, "max_points must be an integer")
 
-    for obj in sorted(resp["Contents"], key=lambda x: x["Key"]):
-        key = obj["Key"]
+    parts = read_line_files("GC", start_date, end_date, today)
+    if not parts:
+        print("No files found in range")
+        return _empty_response(event)
 
-        # extract date YYYY-MM-DD 
-        match = re.search(r"\d{4}-\d{2}-\d{2}", key)
-        if not match:
-            print(f"Could not extract date from key: {key}")
-            continue
+    all_data = []
+    dates = []
+    for part_dates, file_raw in parts:
+        dates.extend(part_dates)
+        if resolution == "10min":
+            all_data.extend(file_raw.get("data", []))
+        else:
+            # rollups carry precomputed aggregates, single days are aggregated here
+            agg_key = "hourly" if resolution == "hour" else "daily"
+            all_data.extend(file_raw.get(agg_key) or rollups.aggregate(file_raw.get("data", []), resolution))
+
+    # keep the chart light for long ranges, peaks of both series survive
+    total_points = len(all_data)
+    if max_points:
+        all_data = downsample_rows(all_data, max_points)
 
-        file_date = datetime.strptime(match.group(0), "%Y-%m-%d").date()
+    final_output = {
+        "metadata": {
+            "station": "Gold Coast Seaway",
+            "unit": "knots",
+            "dates": dates,
+            "graph_type": "line",
+            "resolution": resolution,
+            "total_points": total_points,
+            "downsampled": len(all_data) < total_points
+        },
+        "data": all_data
+    }
 
+    return respond(event, _payload(params, final_output), max_age=_max_age(end_date, today))
 
-        if start_date and file_date < start_date:
-            print(f"  Skipping {key} (before start)")
-            continue
-        if end_date and file_date > end_date:
-            print(f"  Skipping {key} (after end)")
-            continue
 
-        file_obj = s3.get_object(Bucket=ANALYSIS_BUCKET, Key=key)
-        file_raw = json.loads(file_obj["Body"].read())
+def build_scatter_graph(params, event):
+    """
+    Actual vs predicted over start/end, at a fixed size whatever the range:
+    mode=hist   merged 1 knot 2D histogram, one row per non-empty cell
+    mode=sample stratified sample of at most n rows (default 2000)
+    """
+    start_str = params.get("start")
+    end_str = params.get("end")
 
-        data_count = len(file_raw.get("data", []))
+    start_date = datetime.strptime(start_str, "%Y-%m-%d").date() if start_str else None
+    end_date = datetime.strptime(end_str, "%Y-%m-%d").date() if end_str else None
 
-        all_data.extend(file_raw.get("data", []))
-        dates.append(str(file_date))
+    mode = params.get("mode", "sample")
+    if mode not in ("hist", "sample"):
+        return _error_response(event, f"Unknown scatter mode: {mode}")
+    try:
+        n = min(max(int(params.get("n", SCATTER_POINTS)), 1), MAX_SCATTER_POINTS)
+    except ValueError:
+        return _error_response(event, "n must be an integer")
+
+    today = datetime.now(ZoneInfo("Australia/Brisbane")).date()
+    # the histogram alone only needs each file's stored "scatter", not its rows
+    parts = read_line_files("GC", start_date, end_date, today, paths=HIST_PATHS if mode == "hist" else None)
+    if not parts:
+        print("No files found in range")
+        return _empty_response(event)
+
+    dates = [d for part_dates, _ in parts for d in part_dates]
+    hist = scatter.merge(_stored_histogram("GC", part_dates, f) for part_dates, f in parts)
+    total = sum(c for _, _, c in hist["counts"])
+
+    if mode == "hist":
+        half = hist["bin_size"] / 2
+        data = [
+            {"actual": i * hist["bin_size"] + half, "predicted": j * hist["bin_size"] + half, "count": c}
+            for i, j, c in hist["counts"]
+        ]
+    else:
+        rows = (r for _, f in parts for r in f.get("data", []))
+        data = scatter.stratified_sample(rows, hist, n)
 
     final_output = {
         "metadata": {
             "station": "Gold Coast Seaway",
             "unit": "knots",
             "dates": dates,
-            "graph_type": "line"
+            "graph_type": "scatter",
+            "mode": mode,
+            "bin_size": hist["bin_size"],
+            "total_points": total
         },
-        "data": all_data
+        "data": data
     }
 
-    return {
-        "statusCode": 200,
-        "headers": {
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "GET,OPTIONS",
-            "Access-Control-Allow-Headers": "Content-Type",
-            "Content-Type": "application/json",
-        },
-        "body": json.dumps(final_output)
-    }
+    return respond(event, _payload(params, final_output), max_age=_max_age(end_date, today))
 
 
-def _empty_response():
-    return {
-        "statusCode": 200,
-        "body": json.dumps({"metadata": {}, "data": []}),
-        "headers": {"Content-Type": "application/json"}
-    }
+def _stored_histogram(station, part_dates, f):
+    if f.get("scatter"):
+        return f["scatter"]
+    # older day files predate the stored histogram, bin those on the fly
+    rows = f.get("data")
+    if rows is None:   # read with HIST_PATHS
+        rows = cache.get_json(ANALYSIS_BUCKET, f"{station}{part_dates[0]}.json", mutable=True).get("data", [])
+    return scatter.histogram(rows)
+
+
+def read_line_files(station, start_date, end_date, today, paths=None):
+    """
+    [(dates, file)] covering the range in order, using the coarsest closed
+    rollup (year, then month) for each stretch and day files for the rest.
+    A rollup is only used when it holds every day the manifest lists for
+    its stretch; one that is missing or was started after older days were
+    written falls back to the day files. With `paths` only those parts of
+    each file are read.
+    """
+    if start_date and end_date:
+        pieces = rollups.plan(start_date, end_date, today)
+    else:
+        pieces = [("days", None, start_date, end_date)]
 
+    rollup_paths = paths and tuple(paths) + ("metadata.dates",)   # for the coverage check
 
-def _error_response(message):
-    return {
-        "statusCode": 400,
-        "body": json.dumps({"error": message}),
-        "headers": {"Content-Type": "application/json"}
+    def load_rollup(piece):
+        # rollups are rewritten by the daily run and by rebuilds, so always revalidated
+        tier, period, _, _ = piece
+        try:
+            return cache.get_json(ANALYSIS_BUCKET, rollups.rollup_key(station, tier, period), mutable=True, paths=rollup_paths)
+        except s3.exceptions.NoSuchKey:
+            return None
+
+    rollup_pieces = [p for p in pieces if p[0] != "days"]
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        loaded = dict(zip(rollup_pieces, pool.map(load_rollup, rollup_pieces)))
+
+    # one manifest read for the whole range, split per piece
+    days = find_day_keys(station, start_date, end_date)
+    day_keys = {p: [dk for dk in days if _in_piece(dk[0], p)] for p in pieces}
+    found = {
+        p: r for p, r in loaded.items()
+        if r and {str(d) for d, _, _ in day_keys[p]} <= set(r["metadata"].get("dates", []))
     }
+    day_keys = {p: dks for p, dks in day_keys.items() if p not in found}
+    flat = [dk for dks in day_keys.values() for dk in dks]
 
-def build_bar_graph(params):
+    # fetch all days at once; a cached day is served as is only while it still has the manifest's ETag
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        files = dict(zip(flat, pool.map(
+            lambda dk: cache.get_json(ANALYSIS_BUCKET, dk[1], mutable=True, etag=dk[2], paths=paths),
+            flat
+        )))
+
+    parts = []
+    for p in pieces:
+        if p in found:
+            parts.append((found[p]["metadata"].get("dates", []), found[p]))
+        else:
+            parts.extend(([str(dk[0])], files[dk]) for dk in day_keys[p])
+    return parts
+
+
+def _in_piece(day, piece):
+    _, _, lo, hi = piece
+    return (lo is None or lo <= day) and (hi is None or day <= hi)
+
+
+def find_day_keys(station, start_date, end_date):
+    """
+    Sorted [(date, key, etag)] of the station's analysis days in the range,
+    from the (revalidated) manifest, or a bucket listing if there is no
+    manifest yet.
+    """
+    try:
+        index = cache.get_json(ANALYSIS_BUCKET, manifest.manifest_key(station), mutable=True)
+    except s3.exceptions.NoSuchKey:
+        return list_day_keys(station, start_date, end_date)
+    return [
+        (d, f"{station}{d}.json", index["days"][str(d)].get("etag"))
+        for d in manifest.days_in_range(index, start_date, end_date)
+    ]
+
+
+def list_day_keys(prefix, start_date, end_date):
+    """Sorted [(date, key, etag)] of <prefix>YYYY-MM-DD.json objects in the range."""
+    return [
+        (date.fromisoformat(date_str), obj["Key"], obj["ETag"])
+        for date_str, obj in s3util.list_dated(s3, ANALYSIS_BUCKET, prefix, start_date, end_date)
+    ]
+
+
+def _payload(params, final_output, time_key="time"):
+    # format=columnar: one array per field instead of one object per row
+    if wire.wants_columnar(params):
+        return wire.rows_to_columnar(final_output["metadata"], final_output["data"], time_key)
+    return final_output
+
+
+def _row_date(row):
+    return row["date"]
+
+
+def read_daily_partitions(prefix, start_date, end_date):
+    """
+    Year partitions of daily metrics overlapping the range, oldest first.
+    Falls back to the single legacy file until the first compaction.
     """
-    Reads analysis-wind/GCdaily.json and returns daily metrics
-    filtered by start/end (YYYY-MM-DD). Inclusive on both ends.
+    years = dailymetrics.years_in_range(s3, ANALYSIS_BUCKET, prefix, start_date, end_date)
+
+    def load(key):
+        try:
+            return cache.get_json(ANALYSIS_BUCKET, key, mutable=True)
+        except s3.exceptions.NoSuchKey:
+            return None
+
+    keys = [dailymetrics.partition_key(prefix, y) for y in years]
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        partitions = [p for p in pool.map(load, keys) if p]
+    if partitions:
+        return partitions
+
+    legacy = load(dailymetrics.legacy_key(prefix))
+    return [legacy] if legacy else []
+
+
+def _max_age(end_date, today):
+    """Closed ranges are immutable; anything touching today follows the 10-minute ingest."""
+    if end_date and (today - end_date).days > 1:
+        return HISTORY_MAX_AGE
+    return seconds_until_next(600, lag=60)
+
+
+def _empty_response(event):
+    return respond(event, {"metadata": {}, "data": []})
+
+
+def _error_response(event, message):
+    return error(event, message)
+
+def build_bar_graph(params, event):
+    """
+    Reads the analysis-wind/GCdaily<YYYY>.json partitions overlapping
+    start/end (YYYY-MM-DD) and returns their daily metrics. Inclusive on
+    both ends. fields=mae,rmse limits the metrics returned (default all the
+    flat ones); fields=gust,by_hour,by_speed,by_direction adds the gust
+    metrics and breakdowns, which days built before them lack (null).
     """
     start_str = params.get("start")
     end_str = params.get("end")
@@ -113,49 +307,26 @@ def build_bar_graph(params):
     start_date = datetime.strptime(start_str, "%Y-%m-%d").date() if start_str else None
     end_date = datetime.strptime(end_str, "%Y-%m-%d").date() if end_str else None
 
-    # Load GCdaily.json
-    try:
-        obj = s3.get_object(Bucket=ANALYSIS_BUCKET, Key="GCdaily.json")
-        body = json.loads(obj["Body"].read())
-    except Exception as e:
-        print(f"GCdaily.json not found or unreadable: {e}")
-        return _empty_response()
+    fields = tuple(f for f in params.get("fields", "").split(",") if f) or METRIC_FIELDS
+    unknown = [f for f in fields if f not in METRIC_FIELDS + BREAKDOWN_FIELDS]
+    if unknown:
+        return _error_response(event, f"Unknown fields: {','.join(unknown)}")
 
-    station = body.get("station", "Gold Coast Seaway")
-    unit = body.get("unit", "knots")
-    daily = body.get("daily", [])
+    partitions = read_daily_partitions("GC", start_date, end_date)
+    if not partitions:
+        print("No daily metrics found in range")
+        return _empty_response(event)
 
-    # filter rows
+    station = partitions[0].get("station", "Gold Coast Seaway")
+    unit = partitions[0].get("unit", "knots")
+
+    # partitions come oldest first, each stored sorted by ISO date (sorts as a string)
     data = []
-    for item in daily:
-        dstr = item.get("date")
-        if not dstr:
-            continue
-        try:
-            d = datetime.strptime(dstr, "%Y-%m-%d").date()
-        except Exception:
-            continue
-
-        if start_date and d < start_date:
-            continue
-        if end_date and d > end_date:
-            continue
-
-        # provide full metrics
-        data.append({
-            "date": dstr,
-            "n": item.get("n"),
-            "coverage": item.get("coverage"),
-            "mae": item.get("mae"),
-            "rmse": item.get("rmse"),
-            "bias": item.get("bias"),
-            "smape": item.get("smape"),
-            "mean_actual": item.get("mean_actual"),
-            "mean_predicted": item.get("mean_predicted"),
-        })
-
-    # ascending date order
-    data.sort(key=lambda r: r["date"])
+    for partition in partitions:
+        daily = partition.get("daily", [])
+        lo = bisect_left(daily, str(start_date), key=_row_date) if start_date else 0
+        hi = bisect_right(daily, str(end_date), key=_row_date) if end_date else len(daily)
+        data.extend({f: item.get(f) for f in ("date",) + fields} for item in daily[lo:hi])
 
     final_output = {
         "metadata": {
@@ -167,13 +338,5 @@ def build_bar_graph(params):
         "data": data
     }
 
-    return {
-        "statusCode": 200,
-        "headers": {
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "GET,OPTIONS",
-            "Access-Control-Allow-Headers": "Content-Type",
-            "Content-Type": "application/json",
-        },
-        "body": json.dumps(final_output)
-    }
+    today = datetime.now(ZoneInfo("Australia/Brisbane")).date()
+    return respond(event, _payload(params, final_output, time_key="date"), max_age=_max_age(end_date, today))
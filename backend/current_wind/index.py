@@ -2,11 +2,50 @@ import json, os, datetime, requests, boto3
 from zoneinfo import ZoneInfo
 from bisect import bisect_left
 import datetime
+from wind_common import manifest, scatter, wire
+from wind_common.columnar import encode_observations
+from wind_common.timeslice import day_window, slice_observations, slice_points, to_epoch
+from wind_common.jsonstream import load_paths
+from wind_common.responses import respond, seconds_until_next
+from wind_common.s3write import put_if_changed
+from snapshot import SnapshotCache
 
 s3 = boto3.resource("s3")
 BASE_URL = "https://api.willyweather.com.au/v2/"
 
+# ready-to-serve /submit payload, rewritten by the 10-minute ingest schedule
+SNAPSHOT_BUCKET = "current-wind"
+SNAPSHOT_KEYS = {"rows": "GClatest.json", "columnar": "GClatest.columnar.json"}
+# one lease for both formats: a single ingest() refreshes them together
+SNAPSHOT_LEASE = "GClatest.lease"
+CADENCE = 600   # seconds between WillyWeather observations
+
+FORECAST_BUCKET = "forecast-wind"
+ANALYSIS_BUCKET = "analysis-wind"
+
+
 def lambda_handler(event, context):
+    # EventBridge schedule
+    if (event or {}).get("mode") == "ingest":
+        payloads = ingest()
+        for fmt, snapshot in snapshots.items():
+            snapshot.publish(json.dumps(payloads[fmt]))
+        return {"statusCode": 200, "body": json.dumps("snapshot saved")}
+
+    params = (event or {}).get("queryStringParameters") or {}
+    fmt = "columnar" if wire.wants_columnar(params) else "rows"
+
+    # cacheable until a minute after the next observation, when ingest runs
+    snapshot = snapshots[fmt]
+    body = snapshot.get()
+    return respond(event, body, max_age=seconds_until_next(CADENCE, lag=60), last_modified=snapshot.generated)
+
+
+def ingest():
+    """
+    Pull the latest observations, store today's record and analysis files
+    and return the /submit payload in each response format.
+    """
     api_key = os.environ["WW_API_KEY"]
 
     bris = ZoneInfo("Australia/Brisbane")
@@ -53,13 +92,14 @@ def lambda_handler(event, context):
 
     now_utc = datetime.datetime.now(datetime.timezone.utc)
     cutoff = now_utc - datetime.timedelta(hours=12)
-    
+
+    # skip straight to the last 12 h instead of testing every point
+    first = bisect_left(wind_points, to_epoch(cutoff), key=lambda p: p["x"])
+
     graph_data = []
-    for i, p in enumerate(wind_points):
+    for i in range(first, len(wind_points)):
+        p = wind_points[i]
         dt = datetime.datetime.fromtimestamp(p["x"], tz=datetime.timezone.utc)
-
-        if dt < cutoff:
-            continue
         gust_val = gust_points[i]["y"] * 0.539957 if i < len(gust_points) else None
 
         graph_data.append({
@@ -79,35 +119,41 @@ def lambda_handler(event, context):
         "data": graph_data
     }
 
+    # same rows for format=columnar, with real epoch times instead of HH:MM
+    times = [wire.local_to_epoch(wind_points[i]["x"]) for i in range(first, len(wind_points))]
+    columnar_output = wire.columnar(
+        final_output["metadata"],
+        {name: [row[name] for row in graph_data] for name in
+         ("wind_knots", "direction_degrees", "direction_text", "wind_gust_knots")},
+        times=times
+    )
+
 
     
     # filter and treat utc as local time
-    start = datetime.datetime(today.year, today.month, today.day, 0, 0, 0)
-    end   = start + datetime.timedelta(days=1)
-
-    for graph_name, graph in data.get("observationalGraphs", {}).items():
-        for group in graph.get("dataConfig", {}).get("series", {}).get("groups", []):
-            filtered_points = []
-            for pt in group.get("points", []):
-                dt = datetime.datetime.utcfromtimestamp(pt["x"])  # interpret as Brisbane local
-                if start <= dt < end and dt <= now_bris.replace(tzinfo=None):
-                    filtered_points.append(pt)
-            group["points"] = filtered_points
+    start, end = day_window(today)
+    # points stamped up to and including "now" (Brisbane local read as UTC)
+    now_local = to_epoch(now_bris.replace(tzinfo=None, microsecond=0)) + 1
+    slice_observations(data, start, min(end, now_local))
 
     # save to s3
     out_key = f"GC{today_str}.json"
-    s3.Object("record-wind", out_key).put(
-        Body=json.dumps(data),
-        ContentType="application/json"
+    record_body = json.dumps(data)
+    # skipped when WillyWeather has nothing new since the last ingest
+    record_resp = put_if_changed(s3.meta.client, "record-wind", out_key, record_body, ContentType="application/json")
+    put_if_changed(
+        s3.meta.client, "record-wind", f"GC{today_str}.cols",
+        encode_observations(data, "GC", today_str),
+        ContentType="application/octet-stream"
     )
+    if record_resp is not None:
+        today_wind = data["observationalGraphs"]["wind"]["dataConfig"]["series"]["groups"]
+        manifest.record_days(s3.meta.client, "record-wind", "GC", {
+            today_str: manifest.day_entry(record_resp, record_body, sum(len(g["points"]) for g in today_wind))
+        })
 
 
-    #### CREATE TODAYS ANALYSIS FILE
-
-  
-    forecast_bucket = "forecast-wind"
-    analysis_bucket = "analysis-wind"
-
+    #### UPDATE TODAYS ANALYSIS FILE
 
     # filter actual_points to today only for analysis and use memory data
 # pick today's group (WW splits data: group[0]=yesterday, group[1]=today)
@@ -118,75 +164,68 @@ def lambda_handler(event, context):
         today_group = wind_groups[0]["points"]   # fallback if only one group
 
     # filter for todays points:
-    actual_points = [
-        pt for pt in today_group
-        if start <= datetime.datetime.utcfromtimestamp(pt["x"]) < end
-    ]
-
-    # read forecast data  from s3
-    forecast_key = f"GC{today_str}.json"
-    forecast_obj = s3.meta.client.get_object(Bucket=forecast_bucket, Key=forecast_key)
-    forecast_raw = json.loads(forecast_obj["Body"].read())
-
-    start_bris = datetime.datetime(today.year, today.month, today.day, 0, 0, 0, tzinfo=bris)
-    end_bris   = start_bris + datetime.timedelta(days=1)
-
-    # collect forecast entries
-    raw_entries = []
-    for day in forecast_raw["forecasts"]["wind"]["days"]:
-        for e in day["entries"]:
-            ts = datetime.datetime.fromisoformat(e["dateTime"])
-            if ts.tzinfo is None:
-                ts = ts.replace(tzinfo=bris)
-            else:
-                ts = ts.astimezone(bris)
-            if start_bris <= ts < end_bris:
-                raw_entries.append({
-                    "ts": ts,
-                    "wind_knots": e["speed"] * 0.539957  # knots
-                })
-    raw_entries.sort(key=lambda p: p["ts"])
-
-    # interpolate forecast to 10 min steps
-    forecast_points = []
-    for a, b in zip(raw_entries, raw_entries[1:]):
-        forecast_points.append({"ts": a["ts"], "wind_knots": a["wind_knots"]})
-        t = a["ts"]
-        while (t + datetime.timedelta(minutes=10)) < b["ts"]:
-            t += datetime.timedelta(minutes=10)
-            frac = (t - a["ts"]).total_seconds() / (b["ts"] - a["ts"]).total_seconds()
-            interp_val = a["wind_knots"] + frac * (b["wind_knots"] - a["wind_knots"])
-            forecast_points.append({"ts": t, "wind_knots": interp_val})
-    if raw_entries:
-        forecast_points.append(raw_entries[-1])
-
-    forecast_times = [f["ts"] for f in forecast_points]
-    forecast_knots = [f["wind_knots"] for f in forecast_points]
-
-    def find_nearest_forecast(ts):
-        if not forecast_times:
-            return None
-        i = bisect_left(forecast_times, ts)
-        if i == 0:
-            return forecast_knots[0]
-        if i == len(forecast_times):
-            return forecast_knots[-1]
-        before, after = forecast_times[i-1], forecast_times[i]
-        if abs((ts - before).total_seconds()) <= abs((after - ts).total_seconds()):
-            return forecast_knots[i-1]
-        return forecast_knots[i]
-
-    # merge actual vs forecast
-    merged = []
-    for p in actual_points:
+    actual_points = slice_points(today_group, start, end)
+    update_today_analysis(today, bris, actual_points)
+
+    return {"rows": final_output, "columnar": columnar_output}
+
+
+def refresh(fmt):
+    # one upstream call refreshes both formats
+    payloads = ingest()
+    for other, snapshot in snapshots.items():
+        if other != fmt:
+            snapshot.publish(json.dumps(payloads[other]))
+    return json.dumps(payloads[fmt])
+
+
+# one per container and format, so warm invocations share the in-memory copy
+snapshots = {
+    fmt: SnapshotCache(
+        s3.meta.client, SNAPSHOT_BUCKET, key,
+        refresh=lambda fmt=fmt: refresh(fmt),
+        cadence=CADENCE, max_age=2 * CADENCE,
+        lease_key=SNAPSHOT_LEASE
+    )
+    for fmt, key in SNAPSHOT_KEYS.items()
+}
+
+
+# today's analysis kept between warm invocations:
+# {"date", "forecast_times", "forecast_knots", "merged", "last_x"}
+_analysis = {}
+
+
+def update_today_analysis(today, bris, actual_points):
+    """
+    Append only the observations newer than the last processed one to
+    today's forecast-vs-actual rows. The interpolated forecast is built once
+    per day per container, and nothing is written when no new observation
+    has arrived. S3 cannot append, so new rows still rewrite the object.
+    """
+    # NumPy is only imported on the ingest path; API requests just serve the snapshot
+    from wind_common.forecast import KMH_TO_KNOTS, nearest
+
+    today_str = today.strftime("%Y-%m-%d")
+    if _analysis.get("date") != today_str:
+        _analysis.clear()
+        _analysis.update(load_today_analysis(today, bris))
+
+    new_points = slice_points(actual_points, _analysis["last_x"] + 1, float("inf"))
+    if not new_points:
+        print(f"no new observations since {_analysis['last_x']}, analysis unchanged")
+        return
+
+    merged = _analysis["merged"]
+    predicted = nearest(_analysis["forecast_times"], _analysis["forecast_knots"], [p["x"] for p in new_points])
+    for p, pred in zip(new_points, predicted):
         ts = datetime.datetime.utcfromtimestamp(p["x"]).replace(tzinfo=bris)  # treat as Brisbane local
-        if not (start_bris <= ts < end_bris):
-            continue
         merged.append({
             "time": ts.isoformat(),
-            "actual": p["y"] * 0.539957,   #  knots
-            "predicted": find_nearest_forecast(ts)
+            "actual": p["y"] * KMH_TO_KNOTS,   #  knots
+            "predicted": pred
         })
+    _analysis["last_x"] = new_points[-1]["x"]
 
     out = {
         "metadata": {
@@ -194,35 +233,49 @@ def lambda_handler(event, context):
             "unit": "knots",
             "date": today_str
         },
-        "data": merged
+        "data": merged,
+        "scatter": scatter.histogram(merged)
     }
 
-    out_key = f"GC{today_str}.json"
-    s3.meta.client.put_object(
-        Bucket=analysis_bucket,
-        Key=out_key,
-        Body=json.dumps(out),
-        ContentType="application/json"
-    )
-
+    body = json.dumps(out)
+    resp = put_if_changed(s3.meta.client, ANALYSIS_BUCKET, f"GC{today_str}.json", body, ContentType="application/json")
+    if resp is None:
+        return
+    manifest.record_days(s3.meta.client, ANALYSIS_BUCKET, "GC", {today_str: manifest.day_entry(resp, body, len(merged))})
 
 
-    ######
-
+def load_today_analysis(today, bris):
+    """Cold start for the day: interpolate the forecast, pick up rows already written."""
+    today_str = today.strftime("%Y-%m-%d")
+    forecast_times, forecast_knots = load_forecast(today, bris)
+
+    merged, last_x = [], -1
+    try:
+        obj = s3.meta.client.get_object(Bucket=ANALYSIS_BUCKET, Key=f"GC{today_str}.json")
+        merged = load_paths(obj["Body"], ["data"]).get("data", [])
+    except s3.meta.client.exceptions.NoSuchKey:
+        pass
+    if merged:
+        last_local = datetime.datetime.fromisoformat(merged[-1]["time"]).replace(tzinfo=None)
+        last_x = to_epoch(last_local)
 
+    return {
+        "date": today_str,
+        "forecast_times": forecast_times,
+        "forecast_knots": forecast_knots,
+        "merged": merged,
+        "last_x": last_x
+    }
 
 
+def load_forecast(today, bris):
+    """Today's forecast on the 10 min grid: (times, knots) arrays."""
+    from wind_common.forecast import ENTRY_PATHS, parse_entries, window, interpolate
 
+    forecast_key = f"GC{today.strftime('%Y-%m-%d')}.json"
+    forecast_obj = s3.meta.client.get_object(Bucket=FORECAST_BUCKET, Key=forecast_key)
+    forecast_raw = load_paths(forecast_obj["Body"], ENTRY_PATHS)
 
-    
-
-    return {
-        "statusCode": 200,
-        "headers": {
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "GET,OPTIONS",
-            "Access-Control-Allow-Headers": "Content-Type",
-            "Content-Type": "application/json",
-        },
-        "body": json.dumps(final_output)
-    }
+    times, knots, _, _ = parse_entries(forecast_raw, bris)
+    w = window(times, *day_window(today))
+    return interpolate(times[w], knots[w])
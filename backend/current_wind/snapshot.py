@@ -0,0 +1,124 @@
+"""
+Single-flight, stale-while-revalidate access to the /submit snapshot.
+
+Inside a warm container a snapshot younger than one observation cadence is
+served from memory. Across containers a small lease object in S3 decides
+which invocation refreshes a stale snapshot; everybody else keeps serving
+the last good body meanwhile. Caches whose refresh rebuilds the same
+upstream data (one per response format) share a lease_key, so a burst
+over both formats still makes one upstream call. The S3 client and the
+clock are passed in so the logic can run against a local S3 stand-in and
+a fake clock (tests/test_snapshot.py).
+"""
+import json, time, uuid
+from botocore.exceptions import ClientError
+from wind_common.s3util import CONFLICT, MISSING, error_code
+
+
+class SnapshotCache:
+    def __init__(self, s3_client, bucket, key, refresh,
+                 cadence=600, max_age=1200, lease_seconds=60, clock=time.time, lease_key=None):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.lease_key = lease_key or key.rsplit(".", 1)[0] + ".lease"
+        self.lease_etag = None            # ETag of the lease we hold, to release only our own
+        self.refresh = refresh            # () -> body str, does the upstream call
+        self.cadence = cadence            # memory reuse window
+        self.max_age = max_age            # older than this in S3 = stale
+        self.lease_seconds = lease_seconds
+        self.clock = clock
+        self.owner = uuid.uuid4().hex
+        self.body = None
+        self.generated = None
+
+    def get(self):
+        now = self.clock()
+        if self.body is not None and now < self.generated + self.cadence:
+            return self.body
+
+        self._load()
+        if self.body is not None and now - self.generated <= self.max_age:
+            return self.body
+
+        # stale or missing: only the lease holder calls upstream
+        if self._acquire_lease():
+            try:
+                return self.publish(self.refresh())
+            except Exception as e:
+                if self.body is None:
+                    raise
+                print(f"snapshot refresh failed, serving stale copy: {e}")
+                return self.body
+            finally:
+                self._release_lease()
+
+        if self.body is None:
+            # first ever request and someone else is refreshing: nothing to serve yet
+            return self.publish(self.refresh())
+        return self.body
+
+    def publish(self, body):
+        """Store a freshly built body in S3 and memory."""
+        now = self.clock()
+        self.s3.put_object(
+            Bucket=self.bucket,
+            Key=self.key,
+            Body=body,
+            ContentType="application/json",
+            Metadata={"generated": str(now)}
+        )
+        self.body, self.generated = body, now
+        return body
+
+    def _load(self):
+        try:
+            obj = self.s3.get_object(Bucket=self.bucket, Key=self.key)
+        except ClientError as e:
+            if error_code(e) not in MISSING:
+                raise
+            return
+        meta = obj.get("Metadata", {})
+        generated = float(meta["generated"]) if "generated" in meta else obj["LastModified"].timestamp()
+        if self.generated is None or generated >= self.generated:
+            self.body = obj["Body"].read().decode()
+            self.generated = generated
+
+    def _acquire_lease(self):
+        now = self.clock()
+        lease = json.dumps({"owner": self.owner, "expires": now + self.lease_seconds})
+        try:
+            resp = self.s3.put_object(Bucket=self.bucket, Key=self.lease_key, Body=lease, IfNoneMatch="*")
+            self.lease_etag = resp["ETag"]
+            return True
+        except ClientError as e:
+            if error_code(e) not in CONFLICT:
+                raise
+
+        # a lease exists; take it over only if its holder has timed out
+        try:
+            held = self.s3.get_object(Bucket=self.bucket, Key=self.lease_key)
+        except ClientError as e:
+            if error_code(e) in MISSING:
+                return False   # released in between, the snapshot is being written
+            raise
+        if json.loads(held["Body"].read()).get("expires", 0) > now:
+            return False
+        try:
+            resp = self.s3.put_object(Bucket=self.bucket, Key=self.lease_key, Body=lease, IfMatch=held["ETag"])
+            self.lease_etag = resp["ETag"]
+            return True
+        except ClientError as e:
+            if error_code(e) in CONFLICT + MISSING:
+                return False
+            raise
+
+    def _release_lease(self):
+        # only if it is still ours; after a takeover the lease belongs to someone else
+        try:
+            self.s3.delete_object(Bucket=self.bucket, Key=self.lease_key, IfMatch=self.lease_etag)
+        except ClientError as e:
+            if error_code(e) not in CONFLICT + MISSING:
+                print(f"could not release snapshot lease: {e}")
+        finally:
+            self.lease_etag = None
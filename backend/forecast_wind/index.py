@@ -1,87 +1,106 @@
 import json
 import os
+import time
 import datetime
 import boto3
 from zoneinfo import ZoneInfo
+from wind_common import wire
+from wind_common.forecast import build_grid, slice_grid
+from wind_common.responses import respond, seconds_until_next
+from wind_common.timeslice import to_epoch
 
 s3 = boto3.client("s3")
 bucket_name = "forecast-wind"
 
-def lambda_handler(event, context):
-    # find today's file (e.g. GC2025-09-23.json)
-    today = datetime.datetime.now().strftime("%Y-%m-%d")
-    key = f"GC{today}.json"
+DEFAULT_HOURS = 12
+MAX_HOURS = 48
+GRID_TTL = 600   # seconds a warm container trusts its cached grid
+
+# {"key": str, "grid": dict, "expires": epoch}
+_cache = {}
+
 
-    # get the object from S3
-    obj = s3.get_object(Bucket=bucket_name, Key=key)
-    raw = json.loads(obj["Body"].read())
+def lambda_handler(event, context):
+    params = (event or {}).get("queryStringParameters") or {}
+    try:
+        hours = min(max(int(params.get("hours", DEFAULT_HOURS)), 1), MAX_HOURS)
+    except ValueError:
+        hours = DEFAULT_HOURS
 
     bris = ZoneInfo("Australia/Brisbane")
     now = datetime.datetime.now(bris)
     start_hour = (now.replace(minute=0, second=0, microsecond=0)
               + datetime.timedelta(hours=1 if now.minute > 0 or now.second > 0 else 0))
 
-    cutoff = start_hour + datetime.timedelta(hours=12)
-
-    # collect hourly points
-    points = []
-    for day in raw["forecasts"]["wind"]["days"]:
-        for e in day["entries"]:
-            ts = datetime.datetime.fromisoformat(e["dateTime"])
-            ts = ts.astimezone(bris) if ts.tzinfo else ts.replace(tzinfo=bris)
-            if start_hour <= ts <= cutoff:
-                points.append({
-                    "ts": ts,
-                    "wind_knots": e["speed"] * 0.539957,
-                    "direction_degrees": e.get("direction"),
-                    "direction_text": e.get("directionText")
-                })
-
-    points.sort(key=lambda p: p["ts"])
-
-    # interpolate to 10-minute steps
+    cutoff = start_hour + datetime.timedelta(hours=hours)
+
+    # today's pre-interpolated 10 min grid (e.g. GC2025-09-23.grid.json)
+    grid = load_latest_grid(now.date(), bris)
+
+    lo = int(to_epoch(start_hour.replace(tzinfo=None)))
+    hi = int(to_epoch(cutoff.replace(tzinfo=None)))
+    i, j = slice_grid(grid, lo, hi)
+
+    metadata = {
+        "title": f"Gold Coast Seaway Forecast (next {hours} h, 10-min steps)",
+        "unit": "knots",
+        "date": now.strftime("%Y-%m-%d")
+    }
+
+    if wire.wants_columnar(params):
+        body = wire.columnar(
+            metadata,
+            {
+                "wind_knots": grid["knots"][i:j],
+                "direction_degrees": grid["direction"][i:j],
+                "direction_text": grid["direction_text"][i:j]
+            },
+            times=[wire.local_to_epoch(grid["start"] + k * grid["step"]) for k in range(i, j)]
+        )
+        return respond(event, body, max_age=seconds_until_next(3600))
+
     filled = []
-    for a, b in zip(points, points[1:]):
+    for k in range(i, j):
+        t = grid["start"] + k * grid["step"]
         filled.append({
-            "x": a["ts"].strftime("%H:%M"),
-            "wind_knots": a["wind_knots"],
-            "direction_degrees": a["direction_degrees"],
-            "direction_text": a["direction_text"]
+            "x": datetime.datetime.utcfromtimestamp(t).strftime("%H:%M"),
+            "wind_knots": grid["knots"][k],
+            "direction_degrees": grid["direction"][k],
+            "direction_text": grid["direction_text"][k]
         })
 
-        t = a["ts"]
-        while (t + datetime.timedelta(minutes=10)) < b["ts"]:
-            t += datetime.timedelta(minutes=10)
-            frac = (t - a["ts"]).total_seconds() / (b["ts"] - a["ts"]).total_seconds()
-            filled.append({
-                "x": t.strftime("%H:%M"),
-                "wind_knots": a["wind_knots"] + frac * (b["wind_knots"] - a["wind_knots"]),
-                "direction_degrees": a["direction_degrees"],
-                "direction_text": a["direction_text"]
-            })
-
-    if points:
-        last = points[-1]
-        filled.append({
-            "x": last["ts"].strftime("%H:%M"),
-            "wind_knots": last["wind_knots"],
-            "direction_degrees": last["direction_degrees"],
-            "direction_text": last["direction_text"]
-        })
+    # the window moves on the hour
+    return respond(event, {"metadata": metadata, "data": filled}, max_age=seconds_until_next(3600))
 
-    return {
-        "statusCode": 200,
-        "headers": {
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "GET,OPTIONS",
-            "Content-Type": "application/json"
-        },
-        "body": json.dumps({
-            "metadata": {
-                "title": "Gold Coast Seaway Forecast (next 12 h, 10-min steps)",
-                "unit": "knots",
-                "date": now.strftime("%Y-%m-%d")
-            },
-            "data": filled
-        })
-    }
+
+def load_latest_grid(day, bris):
+    """
+    The grid for `day`, or the day before's until record_wind has stored
+    today's (00:05, or later if that run failed). Forecasts run two days
+    ahead, so yesterday's still covers the next hours.
+    """
+    try:
+        return load_grid(str(day), bris)
+    except s3.exceptions.NoSuchKey:
+        print(f"no forecast stored for {day} yet, serving the previous day's")
+        return load_grid(str(day - datetime.timedelta(days=1)), bris)
+
+
+def load_grid(date_str, bris):
+    """
+    The grid written at ingest, cached while the container is warm. Days
+    ingested before grids existed are interpolated from the raw forecast.
+    """
+    key = f"GC{date_str}.grid.json"
+    if _cache.get("key") == key and time.time() < _cache["expires"]:
+        return _cache["grid"]
+
+    try:
+        obj = s3.get_object(Bucket=bucket_name, Key=key)
+        grid = json.loads(obj["Body"].read())
+    except s3.exceptions.NoSuchKey:
+        obj = s3.get_object(Bucket=bucket_name, Key=f"GC{date_str}.json")
+        grid = build_grid(json.loads(obj["Body"].read()), bris)
+
+    _cache.update(key=key, grid=grid, expires=time.time() + GRID_TTL)
+    return grid
@@ -1,12 +1,34 @@
 import json, boto3, os, requests, datetime
 from zoneinfo import ZoneInfo
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from wind_common.columnar import encode_observations
+from wind_common.forecast import build_grid
+from wind_common import manifest, s3util
+from wind_common.timeslice import day_window, slice_observations
+from wind_common.s3write import put_if_changed
 
 s3 = boto3.resource("s3")
 BASE_URL = "https://api.willyweather.com.au/v2/"
 
+OBS = "wind,pressure,wind-gust,rainfall,temperature,apparent-temperature,cloud,delta-t,dew-point,humidity"
+STATIONS = [
+    ["GC","18591"], ["COOLLY","18118"], ["HOPE","39817"],
+    ["BANANA","39818"], ["CAPE","30280"], ["BYRON_MAIN","19017"]
+]
+MAX_WORKERS = int(os.environ.get("RECORD_MAX_WORKERS", "8"))
+
+# one keep-alive pool to api.willyweather.com.au shared by every worker thread
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS))
+
+
 def lambda_handler(event, context):
     api_key = os.environ["WW_API_KEY"]
 
+    if (event or {}).get("mode") == "backfill":
+        return backfill(event, context, api_key)
+
     # Brisbane time for defining yesterday today
     bris = ZoneInfo("Australia/Brisbane")
     now_bris = datetime.datetime.now(bris)
@@ -14,61 +36,202 @@ def lambda_handler(event, context):
     date_str = yesterday.strftime("%Y-%m-%d")
     today = now_bris.date()
 
-    obs = "wind,pressure,wind-gust,rainfall,temperature,apparent-temperature,cloud,delta-t,dew-point,humidity"
-    stations = [
-        ["GC","18591"], ["COOLLY","18118"], ["HOPE","39817"],
-        ["BANANA","39818"], ["CAPE","30280"], ["BYRON_MAIN","19017"]
-    ]
-    for name, sid in stations:
-        filter_and_store(
+    jobs = {}
+    for name, sid in STATIONS:
+        jobs[name] = (
+            filter_and_store,
             f"{BASE_URL}{api_key}/locations/{sid}/weather.json",
-            {"observationalGraphs": obs, "startDate": date_str},
+            {"observationalGraphs": OBS, "startDate": date_str},
             "record-wind",
             f"{name}{date_str}.json",
             yesterday
         )
 
-    # forecast 
-    fetch_and_store(
+    # forecast, plus its 10 min grid for /forecast
+    jobs["forecast"] = (
+        fetch_and_store_forecast,
         f"{BASE_URL}{api_key}/locations/18591/weather.json",
         {"forecasts": "wind", "days": 2},
         "forecast-wind",
         f"GC{today}.json"
     )
 
+    results, errors = run_jobs(jobs)
+    update_manifests(results.values())
+    if errors:
+        # raise rather than return, so the scheduled (async) invocation is retried and counted as failed
+        raise RuntimeError(f"record_wind finished with errors: {json.dumps(errors)}")
+
     return {"statusCode": 200, "body": json.dumps("all the files are created")}
 
 
+def backfill(event, context, api_key):
+    """
+    Record every station-day in [start, end] (inclusive, YYYY-MM-DD).
+
+    event = {"mode": "backfill", "start": "...", "end": "...",
+             "stations": ["GC", ...], "concurrency": 8}
+
+    Days already in record-wind are skipped. Finished days are written to a
+    checkpoint object after every batch, so an invocation that runs out of
+    time can simply be invoked again with the same event to carry on.
+    """
+    start = datetime.date.fromisoformat(event["start"])
+    end = datetime.date.fromisoformat(event["end"])
+    wanted = set(event.get("stations") or [name for name, _ in STATIONS])
+    stations = [(name, sid) for name, sid in STATIONS if name in wanted]
+    concurrency = int(event.get("concurrency", MAX_WORKERS))
+
+    bucket = "record-wind"
+    checkpoint_key = f"backfill/{'-'.join(sorted(wanted))}_{start}_{end}.json"
+    checkpoint = load_checkpoint(bucket, checkpoint_key)
+    done = set(checkpoint["done"])
+
+    todo = []
+    for name, sid in stations:
+        existing = existing_keys(bucket, name, start, end)
+        day = start
+        while day <= end:
+            key = f"{name}{day}.json"
+            if key not in done and key not in existing:
+                todo.append((name, sid, day, key))
+            day += datetime.timedelta(days=1)
+
+    print(f"backfill {start}..{end}: {len(todo)} station-days to fetch, {len(done)} done before")
+
+    errors = {}
+    for i in range(0, len(todo), concurrency):
+        # leave time to save the checkpoint before Lambda kills us
+        if context and context.get_remaining_time_in_millis() < 15000:
+            break
+
+        batch = todo[i:i + concurrency]
+        jobs = {}
+        for name, sid, day, key in batch:
+            jobs[key] = (
+                filter_and_store,
+                f"{BASE_URL}{api_key}/locations/{sid}/weather.json",
+                {"observationalGraphs": OBS, "startDate": day.strftime("%Y-%m-%d")},
+                bucket,
+                key,
+                day
+            )
+        batch_results, batch_errors = run_jobs(jobs, max_workers=concurrency)
+        update_manifests(batch_results.values())
+        errors.update(batch_errors)
+        done.update(key for *_, key in batch if key not in batch_errors)
+
+        checkpoint["done"] = sorted(done)
+        checkpoint["errors"] = errors
+        save_checkpoint(bucket, checkpoint_key, checkpoint)
+
+    remaining = [key for *_, key in todo if key not in done and key not in errors]
+    body = {
+        "complete": not remaining and not errors,
+        "remaining": len(remaining),
+        "errors": errors,
+        "checkpoint": checkpoint_key
+    }
+    return {"statusCode": 200, "body": json.dumps(body)}
+
+
+def existing_keys(bucket, name, start, end):
+    # only list this station's keys inside the range
+    return {obj["Key"] for _, obj in s3util.list_dated(s3.meta.client, bucket, name, start, end)}
+
+
+def load_checkpoint(bucket, key):
+    try:
+        obj = s3.meta.client.get_object(Bucket=bucket, Key=key)
+        return json.loads(obj["Body"].read())
+    except s3.meta.client.exceptions.NoSuchKey:
+        return {"done": [], "errors": {}}
+
+
+def save_checkpoint(bucket, key, checkpoint):
+    s3.meta.client.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=json.dumps(checkpoint),
+        ContentType="application/json"
+    )
+
+
+def run_jobs(jobs, max_workers=MAX_WORKERS):
+    """
+    Run {name: (func, *args)} jobs on a bounded thread pool.
+    Returns ({name: result}, {name: error message}), so one slow or
+    broken station never stops the others from being stored.
+    """
+    results, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(job[0], *job[1:]): name for name, job in jobs.items()}
+        for fut in as_completed(futures):
+            name = futures[fut]
+            try:
+                results[name] = fut.result()
+            except Exception as e:
+                errors[name] = str(e)
+    return results, errors
+
+
+def update_manifests(stored):
+    """One manifest write per (bucket, station) for [(bucket, station, date, entry)]."""
+    grouped = {}
+    for bucket, station, date_str, entry in stored:
+        if entry is None:   # unchanged, the manifest already has it
+            continue
+        grouped.setdefault((bucket, station), {})[date_str] = entry
+    for (bucket, station), entries in grouped.items():
+        try:
+            manifest.record_days(s3.meta.client, bucket, station, entries)
+        except Exception as e:
+            print(f"manifest update failed for {bucket}/{station}: {e}")
+
+
 def filter_and_store(url, params, bucket, file_name, target_date):
-    r = requests.get(url, params=params, timeout=10)
+    r = session.get(url, params=params, timeout=10)
     r.raise_for_status()
     data = r.json()
 
     # yesterday 00:00 - today 00:00 Brisbane date, but compare as UTC because of willy weather api bug
-    start = datetime.datetime(target_date.year, target_date.month, target_date.day, 0, 0, 0)
-    end   = start + datetime.timedelta(days=1)
-
-    for graph_name, graph in data.get("observationalGraphs", {}).items():
-        for group in graph.get("dataConfig", {}).get("series", {}).get("groups", []):
-            filtered_points = []
-            for pt in group.get("points", []):
-                # Treat timestamps as UTC but actually Brisbane-local
-                dt = datetime.datetime.utcfromtimestamp(pt["x"])
-                if start <= dt < end:
-                    filtered_points.append(pt)
-            group["points"] = filtered_points
-
-    # save filtered JSON
-    s3.Object(bucket, file_name).put(
-        Body=json.dumps(data),
-        ContentType="application/json"
+    start, end = day_window(target_date)
+    slice_observations(data, start, end)
+
+    # save filtered JSON (client is thread safe, resources are not)
+    body = json.dumps(data)
+    resp = put_if_changed(s3.meta.client, bucket, file_name, body, ContentType="application/json")
+
+    # compact columnar copy next to the raw JSON, e.g. GC2025-10-09.cols
+    station = file_name[:-len(f"{target_date}.json")]
+    put_if_changed(
+        s3.meta.client, bucket, file_name[:-len(".json")] + ".cols",
+        encode_observations(data, station, str(target_date)),
+        ContentType="application/octet-stream"
     )
+    if resp is None:
+        return bucket, station, str(target_date), None
+
+    wind_groups = data.get("observationalGraphs", {}).get("wind", {}).get("dataConfig", {}).get("series", {}).get("groups", [])
+    points = sum(len(g.get("points", [])) for g in wind_groups)
+    return bucket, station, str(target_date), manifest.day_entry(resp, body, points)
 
 
-def fetch_and_store(url, params, bucket, file_name):
-    r = requests.get(url, params=params, timeout=10)
+def fetch_and_store_forecast(url, params, bucket, file_name):
+    r = session.get(url, params=params, timeout=10)
     r.raise_for_status()
-    s3.Object(bucket, file_name).put(
-        Body=r.content,
+    resp = put_if_changed(s3.meta.client, bucket, file_name, r.content, ContentType="application/json")
+
+    # pre-interpolated copy so /forecast only has to slice, e.g. GC2025-10-09.grid.json
+    grid = build_grid(r.json(), ZoneInfo("Australia/Brisbane"))
+    put_if_changed(
+        s3.meta.client, bucket, file_name[:-len(".json")] + ".grid.json",
+        json.dumps(grid),
         ContentType="application/json"
     )
+
+    date_str = file_name[len("GC"):-len(".json")]
+    if resp is None:
+        return bucket, "GC", date_str, None
+    # points = 10 min grid steps in the horizon, coverage does not apply
+    return bucket, "GC", date_str, manifest.day_entry(resp, r.content, len(grid["knots"]), expected_slots=None)
@@ -0,0 +1,2 @@
+# Code shared by the wind Lambdas, deployed as the wind_common layer
+# (Lambda puts the layer's python/ folder on sys.path).
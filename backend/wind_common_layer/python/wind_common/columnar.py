@@ -0,0 +1,120 @@
+"""
+Compact per-station, per-day columnar format for recorded observations.
+
+A .cols object is:
+    4 bytes   little-endian header length
+    header    JSON {"version", "station", "date", "byteorder", "columns"}
+    data      raw bytes of every column, back to back
+
+Each observational graph gets "<graph>.x" (epoch seconds, uint32) and
+"<graph>.y" (float64) columns, plus "<graph>.direction" when the points
+carry one. Missing values are NaN. The header stores each column's offset
+so readers can Range-GET just the columns they need.
+"""
+import array, json, math, struct, sys
+
+VERSION = 1
+HEADER_PROBE = 4096   # first range read, big enough for the header in practice
+
+TYPECODES = {"x": "I", "y": "d", "direction": "d"}
+
+
+def encode_observations(data, station, date_str):
+    """Turn a (filtered) WillyWeather observation document into .cols bytes."""
+    columns = {}
+    for graph_name, graph in data.get("observationalGraphs", {}).items():
+        points = []
+        for group in graph.get("dataConfig", {}).get("series", {}).get("groups", []):
+            points.extend(group.get("points", []))
+        points.sort(key=lambda p: p["x"])
+
+        columns[f"{graph_name}.x"] = array.array("I", (int(p["x"]) for p in points))
+        columns[f"{graph_name}.y"] = array.array("d", (_num(p.get("y")) for p in points))
+        if any(p.get("direction") is not None for p in points):
+            columns[f"{graph_name}.direction"] = array.array(
+                "d", (_num(p.get("direction")) for p in points)
+            )
+
+    meta = {}
+    offset = 0
+    for name, col in columns.items():
+        nbytes = col.itemsize * len(col)
+        meta[name] = {"type": col.typecode, "offset": offset, "count": len(col)}
+        offset += nbytes
+
+    header = json.dumps({
+        "version": VERSION,
+        "station": station,
+        "date": date_str,
+        "byteorder": sys.byteorder,
+        "columns": meta
+    }).encode()
+
+    parts = [struct.pack("<I", len(header)), header]
+    parts.extend(col.tobytes() for col in columns.values())
+    return b"".join(parts)
+
+
+def decode(blob, columns=None):
+    """Decode a whole .cols blob, optionally keeping only `columns`."""
+    header, data_start = _parse_header(blob)
+    names = columns or list(header["columns"])
+    return {
+        name: _column(header, name, blob, data_start)
+        for name in names if name in header["columns"]
+    }
+
+
+def read_columns(s3_client, bucket, key, columns):
+    """
+    Fetch only `columns` of a .cols object using S3 Range requests:
+    one small read for the header, one read spanning the wanted columns.
+    """
+    head = _get_range(s3_client, bucket, key, 0, HEADER_PROBE - 1)
+    (header_len,) = struct.unpack_from("<I", head)
+    if 4 + header_len > len(head):
+        head += _get_range(s3_client, bucket, key, len(head), 4 + header_len - 1)
+    header, data_start = _parse_header(head)
+
+    wanted = [c for c in columns if c in header["columns"]]
+    if not wanted:
+        return {}
+
+    spans = [_span(header, c) for c in wanted]
+    lo = min(s for s, _ in spans)
+    hi = max(e for _, e in spans)
+    if hi == lo:
+        return {c: array.array(header["columns"][c]["type"]) for c in wanted}
+
+    body = _get_range(s3_client, bucket, key, data_start + lo, data_start + hi - 1)
+    return {c: _column(header, c, body, -lo) for c in wanted}
+
+
+def _parse_header(blob):
+    (header_len,) = struct.unpack_from("<I", blob)
+    header = json.loads(blob[4:4 + header_len])
+    return header, 4 + header_len
+
+
+def _span(header, name):
+    col = header["columns"][name]
+    size = array.array(col["type"]).itemsize
+    return col["offset"], col["offset"] + size * col["count"]
+
+
+def _column(header, name, blob, data_start):
+    start, end = _span(header, name)
+    col = array.array(header["columns"][name]["type"])
+    col.frombytes(blob[data_start + start:data_start + end])
+    if header.get("byteorder", sys.byteorder) != sys.byteorder:
+        col.byteswap()
+    return col
+
+
+def _get_range(s3_client, bucket, key, first, last):
+    obj = s3_client.get_object(Bucket=bucket, Key=key, Range=f"bytes={first}-{last}")
+    return obj["Body"].read()
+
+
+def _num(v):
+    return float(v) if isinstance(v, (int, float)) else math.nan
@@ -0,0 +1,129 @@
+"""
+Daily forecast-accuracy metrics: one small record per day, compacted into
+year partitions.
+
+analysis_builder writes each day to GCmetrics/2025-10-09.json, a new object
+per day, so adding a day never downloads the history. compact() then folds
+the year's records into GCdaily2025.json, GETting only records whose ETag
+differs from the one already folded in. Both writes are conditional
+(If-None-Match / If-Match) and retried on conflict, like the manifest
+(see s3util).
+
+Readers (the bar graph) only fetch the partitions overlapping their range.
+The old single GCdaily.json is split into partitions the first time a
+station is compacted.
+"""
+import datetime, json
+from botocore.exceptions import ClientError
+from wind_common import s3util
+
+
+def record_key(prefix, date_str):
+    return f"{prefix}metrics/{date_str}.json"
+
+
+def partition_key(prefix, year):
+    return f"{prefix}daily{year}.json"
+
+
+def legacy_key(prefix):
+    return f"{prefix}daily.json"
+
+
+def put_day(s3_client, bucket, prefix, entry):
+    """Write one day's metrics record, replacing an earlier one for the same day under If-Match."""
+    key = record_key(prefix, entry["date"])
+    # tried as a new object first: a HEAD is only needed when the day is rewritten
+    etag = None
+    for _ in range(s3util.RETRIES):
+        if s3util.put_json(s3_client, bucket, key, entry, etag):
+            return
+        try:
+            etag = s3_client.head_object(Bucket=bucket, Key=key)["ETag"]
+        except ClientError as e:
+            if s3util.error_code(e) not in s3util.MISSING:
+                raise
+            etag = None
+    raise RuntimeError(f"gave up writing {bucket}/{key} after {s3util.RETRIES} conflicts")
+
+
+def compact(s3_client, bucket, prefix, year, station, unit, now, model_id="willyweather"):
+    """Fold the year's day records into its partition. Returns the partition."""
+    records = f"{prefix}metrics/"   # record_key()'s prefix
+
+    def update(partition):
+        existed = partition is not None
+        if not existed:
+            partition = _seed(s3_client, bucket, prefix, year, station, unit, model_id)
+
+        rows = {r["date"]: r for r in partition["daily"]}
+        # record ETags already folded in, so unchanged days are not fetched again
+        sources = partition.setdefault("sources", {})
+        changed = False
+        for date_str, obj in s3util.list_dated(s3_client, bucket, records, f"{year}-01-01", f"{year}-12-31"):
+            if sources.get(date_str) == obj["ETag"]:
+                continue
+            record = s3_client.get_object(Bucket=bucket, Key=obj["Key"])
+            rows[date_str] = json.loads(record["Body"].read())
+            sources[date_str] = record["ETag"]
+            changed = True
+
+        if existed and not changed:
+            return None
+
+        partition["daily"] = [rows[d] for d in sorted(rows)]
+        partition["updated_at"] = now.isoformat()
+        return partition
+
+    return s3util.update_json(s3_client, bucket, partition_key(prefix, year), update)
+
+
+def years_in_range(s3_client, bucket, prefix, start_date=None, end_date=None):
+    """Years overlapping [start, end]; open ends are resolved by listing the partitions."""
+    if start_date and end_date:
+        return list(range(start_date.year, end_date.year + 1))
+    partitions = f"{prefix}daily"
+    years = []
+    for page in s3_client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=partitions):
+        for obj in page.get("Contents", []):
+            year = obj["Key"][len(partitions):-len(".json")]
+            if year.isdigit():
+                years.append(int(year))
+    lo = start_date.year if start_date else 0
+    hi = end_date.year if end_date else 9999
+    return [y for y in sorted(years) if lo <= y <= hi]
+
+
+def _new(year, station, unit, model_id):
+    return {"station": station, "unit": unit, "model_id": model_id, "year": year, "daily": [], "sources": {}}
+
+
+def _seed(s3_client, bucket, prefix, year, station, unit, model_id):
+    """
+    Starting partition for `year`. When the legacy single file exists its
+    rows are split out, and the other years' partitions are created too.
+    """
+    legacy, _ = s3util.load_json(s3_client, bucket, legacy_key(prefix))
+    if legacy is None:
+        return _new(year, station, unit, model_id)
+    station = legacy.get("station", station)
+    unit = legacy.get("unit", unit)
+    model_id = legacy.get("model_id", model_id)
+
+    by_year = {}
+    for row in legacy.get("daily", []):
+        if row.get("date"):
+            by_year.setdefault(int(row["date"][:4]), []).append(row)
+
+    for other, rows in by_year.items():
+        if other == year:
+            continue
+        partition = _new(other, station, unit, model_id)
+        partition["daily"] = sorted(rows, key=lambda r: r["date"])
+        partition["updated_at"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        s3util.put_json(s3_client, bucket, partition_key(prefix, other), partition)   # already split: keep it
+
+    partition = _new(year, station, unit, model_id)
+    partition["daily"] = sorted(by_year.get(year, []), key=lambda r: r["date"])
+    return partition
+
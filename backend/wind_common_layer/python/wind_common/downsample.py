@@ -0,0 +1,64 @@
+"""
+Largest-Triangle-Three-Buckets downsampling for line graph rows.
+
+The classic algorithm anchors each bucket on the point picked in the
+previous bucket, which is a sequential loop. Here both anchors are bucket
+averages, so every bucket is solved in one vectorized pass; peaks are kept
+just the same since the largest triangle still wins inside each bucket.
+"""
+import datetime
+import numpy as np
+
+
+def lttb_indices(x, y, n_out):
+    """Indices of the points LTTB keeps out of (x, y); NaNs never win a bucket."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)   # n_out - 2 interior buckets
+    starts, counts = edges[:-1], np.diff(edges)
+    bucket = np.repeat(np.arange(len(starts)), counts)
+
+    valid = ~np.isnan(y)
+    y0 = np.where(valid, y, 0.0)
+    # drop the last point so the last bucket's sums stop at edges[-1]
+    sums_y = np.add.reduceat(y0[:n - 1], starts)
+    hits = np.maximum(np.add.reduceat(valid[:n - 1].astype(np.float64), starts), 1)
+    mean_x = np.add.reduceat(x[:n - 1], starts) / counts
+    mean_y = sums_y / hits
+
+    # previous anchor: average of the bucket before (first point for bucket 0),
+    # next anchor: average of the bucket after (last point for the last bucket)
+    ax = np.concatenate(([x[0]], mean_x[:-1]))[bucket]
+    ay = np.concatenate(([y0[0]], mean_y[:-1]))[bucket]
+    cx = np.concatenate((mean_x[1:], [x[-1]]))[bucket]
+    cy = np.concatenate((mean_y[1:], [y0[-1]]))[bucket]
+
+    xi, yi = x[1:n - 1], y[1:n - 1]
+    area = np.abs((ax - cx) * (yi - ay) - (ax - xi) * (cy - ay))
+    area = np.where(np.isnan(area), -1.0, area)
+
+    best = np.maximum.reduceat(area, starts - 1)
+    winners = np.flatnonzero(area == best[bucket])
+    _, first = np.unique(bucket[winners], return_index=True)
+    return np.concatenate(([0], winners[first] + 1, [n - 1]))
+
+
+def downsample_rows(rows, max_points, fields=("actual", "predicted")):
+    """
+    At most ~max_points rows of {"time", <fields>...}: LTTB is run on every
+    field with an equal share of the budget and the picks are merged, so
+    peaks of both series survive.
+    """
+    if max_points <= 0 or len(rows) <= max_points:
+        return rows
+
+    x = np.array([datetime.datetime.fromisoformat(r["time"]).timestamp() for r in rows])
+    share = max(3, max_points // len(fields))
+    keep = set()
+    for field in fields:
+        y = np.array([r.get(field) if isinstance(r.get(field), (int, float)) else np.nan for r in rows],
+                     dtype=np.float64)
+        keep.update(lttb_indices(x, y, share).tolist())
+    return [rows[i] for i in sorted(keep)]
@@ -0,0 +1,123 @@
+"""
+Forecast parsing, interpolation and nearest matching on NumPy arrays.
+
+Times are epoch seconds on WillyWeather's observation scale: Brisbane wall
+clock read as UTC, the same scale as observation "x" values, so forecasts
+and actuals compare directly.
+"""
+import datetime
+import numpy as np
+
+KMH_TO_KNOTS = 0.539957
+STEP = 600   # 10 minutes
+# the only part of a stored forecast parse_entries reads (see jsonstream)
+ENTRY_PATHS = ["forecasts.wind.days[*].entries"]
+
+
+def parse_entries(forecast_raw, tz, speed_field="speed"):
+    """
+    forecasts.wind.days[].entries[] as sorted arrays:
+    (times, knots, direction_degrees, direction_text).
+    speed_field="gustSpeed" reads gusts instead of the mean speed.
+    Missing values are NaN / None.
+    """
+    rows = []
+    for day in forecast_raw["forecasts"]["wind"]["days"]:
+        for e in day["entries"]:
+            ts = datetime.datetime.fromisoformat(e["dateTime"])
+            if ts.tzinfo is not None:
+                ts = ts.astimezone(tz).replace(tzinfo=None)
+            local = ts.replace(tzinfo=datetime.timezone.utc).timestamp()
+            direction = e.get("direction")
+            speed = e.get(speed_field)
+            rows.append((local, np.nan if speed is None else speed, np.nan if direction is None else direction, e.get("directionText")))
+    rows.sort(key=lambda r: r[0])
+
+    times = np.array([r[0] for r in rows], dtype=np.float64)
+    knots = np.array([r[1] for r in rows], dtype=np.float64) * KMH_TO_KNOTS
+    direction = np.array([r[2] for r in rows], dtype=np.float64)
+    direction_text = [r[3] for r in rows]
+    return times, knots, direction, direction_text
+
+
+def window(times, lo, hi, closed=False):
+    """Slice of sorted `times` inside [lo, hi) (or [lo, hi] when closed)."""
+    i = int(np.searchsorted(times, lo, side="left"))
+    j = int(np.searchsorted(times, hi, side="right" if closed else "left"))
+    return slice(i, j)
+
+
+def interpolate(times, values, step=STEP):
+    """
+    Linear fill between entries: every entry plus entry + k*step while it
+    stays before the next entry, and the last entry itself.
+    Returns (grid_times, grid_values).
+    """
+    if len(times) == 0:
+        return np.empty(0), np.empty(0)
+    gaps = np.diff(times)
+    counts = np.maximum(np.ceil(gaps / step).astype(np.int64), 1)
+    starts = np.repeat(times[:-1], counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    grid = np.append(starts + offsets * step, times[-1])
+    return grid, np.interp(grid, times, values)
+
+
+def segment_index(times, grid):
+    """Index of the entry each grid time was filled from (step hold)."""
+    return np.searchsorted(times, grid, side="right") - 1
+
+
+def nearest(grid, values, obs_times):
+    """
+    Value at the grid time nearest to each observation time (ties go to
+    the earlier one), for a whole batch in one searchsorted.
+    Returns a list with None where the forecast has no value (or none at
+    all), since NaN cannot go into the stored JSON.
+    """
+    obs_times = np.asarray(obs_times, dtype=np.float64)
+    if len(grid) == 0:
+        return [None] * len(obs_times)
+    i = np.searchsorted(grid, obs_times, side="left")
+    after = np.clip(i, 0, len(grid) - 1)
+    before = np.clip(i - 1, 0, len(grid) - 1)
+    pick_before = (obs_times - grid[before]) <= (grid[after] - obs_times)
+    return _json_list(np.asarray(values, dtype=np.float64)[np.where(pick_before, before, after)])
+
+
+def build_grid(forecast_raw, tz, step=STEP):
+    """
+    The whole forecast horizon on a regular step grid, ready to store:
+    {"start", "step", "knots", "direction", "direction_text"}.
+    Speed is interpolated, direction is held from the previous entry.
+    """
+    times, knots, direction, direction_text = parse_entries(forecast_raw, tz)
+    if len(times) == 0:
+        return {"start": None, "step": step, "knots": [], "direction": [], "direction_text": []}
+
+    grid = np.arange(times[0], times[-1] + 1, step)
+    seg = segment_index(times, grid)
+    held = direction[seg]
+    speed = np.round(np.interp(grid, times, knots), 3)
+    return {
+        "start": int(times[0]),
+        "step": step,
+        "knots": _json_list(speed),   # a missing speed spreads NaN over its neighbouring steps
+        "direction": _json_list(held),
+        "direction_text": [direction_text[i] for i in seg.tolist()]
+    }
+
+
+def slice_grid(grid, lo, hi):
+    """Indices [i, j) of a stored grid covering lo <= t <= hi."""
+    if grid["start"] is None:
+        return 0, 0
+    n = len(grid["knots"])
+    i = min(n, max(0, -(-(lo - grid["start"]) // grid["step"])))   # ceil
+    j = min(n, (hi - grid["start"]) // grid["step"] + 1)
+    return int(i), int(max(i, j))
+
+
+def _json_list(values):
+    """values.tolist() with NaN/inf as None; NaN is not valid JSON."""
+    return [v if ok else None for v, ok in zip(values.tolist(), np.isfinite(values).tolist())]
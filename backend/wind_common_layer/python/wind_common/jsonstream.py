@@ -0,0 +1,187 @@
+"""
+Streaming JSON reads that keep only the parts of a document we need.
+
+load_paths() walks a file-like body (an S3 StreamingBody) a chunk at a
+time and builds a skeleton holding just the requested paths, e.g.
+
+    load_paths(obj["Body"], ["forecasts.wind.days[*].entries"])
+    -> {"forecasts": {"wind": {"days": [{"entries": [...]}, ...]}}}
+
+so existing code that indexes into the full document works unchanged.
+Everything off those paths is scanned past without being decoded, so memory
+is one chunk plus the selected values instead of the raw bytes and the
+whole object tree.
+
+Paths are dotted keys; "[*]" (or ".*") means every item, "[n]" one item.
+Array items that are not selected come back as None to keep their indexes.
+"""
+import codecs, json, re
+
+CHUNK_SIZE = 64 * 1024
+
+_NON_WS = re.compile(r"[^ \t\r\n]")
+_STRING = re.compile(r'"(?:[^"\\]|\\.)*"', re.S)
+_SPECIAL = re.compile(r'["{}\[\]]')
+_SCALAR_END = re.compile(r"[ \t\r\n,}\]]")
+
+
+def load_paths(stream, paths, chunk_size=CHUNK_SIZE):
+    """Parse `stream`, materialising only `paths`. Missing paths are simply absent."""
+    targets = [_split(p) for p in paths]
+    reader = _Reader(stream.read, chunk_size)
+    return _walk(reader, targets)
+
+
+def _split(path):
+    path = re.sub(r"\[(\*|\d+)\]", r".\1", path)
+    return tuple(part for part in path.split(".") if part)
+
+
+def _walk(reader, targets):
+    """Value at the reader's position, keeping the `targets` (path suffixes) under it."""
+    if () in targets:
+        return reader.capture()
+
+    c = reader.peek()
+    if c == "{":
+        out = {}
+        reader.pos += 1
+        if reader.peek() == "}":
+            reader.pos += 1
+            return out
+        while True:
+            key = reader.string()
+            reader.expect(":")
+            sub = [t[1:] for t in targets if t[0] in (key, "*")]
+            if sub:
+                out[key] = _walk(reader, sub)
+            else:
+                reader.skip()
+            if reader.delimiter("}"):
+                return out
+
+    if c == "[":
+        out = []
+        reader.pos += 1
+        if reader.peek() == "]":
+            reader.pos += 1
+            return out
+        while True:
+            index = str(len(out))
+            sub = [t[1:] for t in targets if t[0] in (index, "*")]
+            if sub:
+                out.append(_walk(reader, sub))
+            else:
+                reader.skip()
+                out.append(None)
+            if reader.delimiter("]"):
+                return out
+
+    # a scalar where the path wanted to go deeper
+    reader.skip()
+    return None
+
+
+class _Reader:
+    def __init__(self, read, chunk_size):
+        self.read = read
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buf = ""
+        self.pos = 0
+        self.mark = None   # start of the value being captured
+        self.eof = False
+
+    def fill(self):
+        """Append the next chunk, dropping text already consumed. False at end of stream."""
+        if self.eof:
+            return False
+        data = self.read(self.chunk_size)
+        if not data:
+            self.eof = True
+        keep = self.pos if self.mark is None else min(self.pos, self.mark)
+        self.buf = self.buf[keep:] + self.decoder.decode(data or b"", final=not data)
+        self.pos -= keep
+        if self.mark is not None:
+            self.mark -= keep
+        return bool(data)
+
+    def peek(self):
+        """Next non-whitespace character without consuming it ("" at end)."""
+        while True:
+            m = _NON_WS.search(self.buf, self.pos)
+            if m:
+                self.pos = m.start()
+                return self.buf[self.pos]
+            self.pos = len(self.buf)
+            if not self.fill():
+                return ""
+
+    def expect(self, ch):
+        if self.peek() != ch:
+            raise ValueError(f"expected {ch!r} in JSON stream")
+        self.pos += 1
+
+    def delimiter(self, close):
+        """Consume "," or `close` after a member; True when the container ended."""
+        c = self.peek()
+        self.pos += 1
+        if c == close:
+            return True
+        if c != ",":
+            raise ValueError(f"expected ',' or {close!r} in JSON stream")
+        return False
+
+    def string(self, decode=True):
+        if self.peek() != '"':
+            raise ValueError("expected a string in JSON stream")
+        while True:
+            m = _STRING.match(self.buf, self.pos)
+            if m:
+                self.pos = m.end()
+                return json.loads(m.group()) if decode else None
+            if not self.fill():
+                raise ValueError("unterminated string in JSON stream")
+
+    def skip(self):
+        """Consume one value without building it."""
+        c = self.peek()
+        if c == '"':
+            self.string(decode=False)
+        elif c in ("{", "["):
+            depth = 0
+            while True:
+                m = _SPECIAL.search(self.buf, self.pos)
+                if not m:
+                    self.pos = len(self.buf)
+                    if not self.fill():
+                        raise ValueError("unexpected end of JSON stream")
+                    continue
+                self.pos = m.start()
+                if m.group() == '"':
+                    self.string(decode=False)
+                    continue
+                self.pos += 1
+                depth += 1 if m.group() in "{[" else -1
+                if depth == 0:
+                    return
+        elif c:
+            while True:
+                m = _SCALAR_END.search(self.buf, self.pos)
+                if m:
+                    self.pos = m.start()
+                    return
+                self.pos = len(self.buf)
+                if not self.fill():
+                    return
+        else:
+            raise ValueError("unexpected end of JSON stream")
+
+    def capture(self):
+        """Consume one value and decode it."""
+        self.peek()
+        self.mark = self.pos
+        self.skip()
+        text = self.buf[self.mark:self.pos]
+        self.mark = None
+        return json.loads(text)
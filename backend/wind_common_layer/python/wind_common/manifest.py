@@ -0,0 +1,70 @@
+"""
+Per-station manifest of the day objects in a bucket.
+
+<station>manifest.json holds one entry per day with the object's size,
+ETag, point count and coverage, so readers can see which days exist with a
+single GET instead of listing the bucket. Writers update it with
+conditional puts (If-Match / If-None-Match, see s3util.update_json) and
+retry on conflicts. The
+first write seeds the manifest from a full listing, so an existing
+manifest always covers every day in the bucket.
+"""
+import datetime
+from wind_common import s3util
+
+EXPECTED_SLOTS = 144   # 10 min observations per day
+
+
+def manifest_key(station):
+    return f"{station}manifest.json"
+
+
+def day_entry(put_response, body, points=None, expected_slots=EXPECTED_SLOTS):
+    """Manifest entry for an object we just wrote with put_object."""
+    return {
+        "size": len(body),
+        "etag": put_response.get("ETag"),
+        "points": points,
+        "coverage": None if points is None or not expected_slots else points / float(expected_slots),
+    }
+
+
+def record_days(s3_client, bucket, station, entries):
+    """Upsert {date_str: entry} into the station's manifest."""
+    if not entries:
+        return
+
+    def update(manifest):
+        if manifest is None:
+            manifest = rebuild(s3_client, bucket, station)
+        manifest["days"].update(entries)
+        manifest["days"] = dict(sorted(manifest["days"].items()))
+        manifest["updated_at"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        return manifest
+
+    try:
+        s3util.update_json(s3_client, bucket, manifest_key(station), update)
+    except RuntimeError as e:
+        print(e)
+
+
+def load(s3_client, bucket, station):
+    """(manifest, etag), or (None, None) when it does not exist yet."""
+    return s3util.load_json(s3_client, bucket, manifest_key(station))
+
+
+def rebuild(s3_client, bucket, station):
+    """Manifest built from listing every <station>YYYY-MM-DD.json in the bucket."""
+    days = {
+        date_str: {"size": obj["Size"], "etag": obj["ETag"], "points": None, "coverage": None}
+        for date_str, obj in s3util.list_dated(s3_client, bucket, station)
+    }
+    return {"station": station, "bucket": bucket, "days": days}
+
+
+def days_in_range(manifest, start_date=None, end_date=None):
+    """Sorted dates present in the manifest within [start, end]."""
+    lo = str(start_date) if start_date else ""
+    hi = str(end_date) if end_date else "9999"
+    return [datetime.date.fromisoformat(d) for d in sorted(manifest["days"]) if lo <= d <= hi]
+
@@ -0,0 +1,92 @@
+"""
+Forecast verification metrics on NumPy arrays.
+
+Every metric is a ratio of sums (absolute error, squared error, error,
+sMAPE term, actual, predicted), so one set of np.bincount passes over the
+pairs gives them all at once, for the whole day or per group. The same
+code builds the day summary and the breakdowns by hour of day, observed
+speed band and observed direction sector.
+
+Pairs where either side is missing (NaN/None) are ignored.
+"""
+import numpy as np
+
+EPS = 1e-6
+EXPECTED_SLOTS = 144   # 10 min observations per day
+
+METRICS = ("mae", "rmse", "bias", "smape", "mean_actual", "mean_predicted")
+SPEED_BANDS = (0, 5, 10, 15, 20, 25, 30)   # knots, lower edges; the last band is open
+SECTORS = ("N", "NE", "E", "SE", "S", "SW", "W", "NW")
+
+
+def summary(actual, predicted, expected_slots=EXPECTED_SLOTS):
+    """{"n", "coverage", "mae", "rmse", "bias", "smape", "mean_actual", "mean_predicted"}."""
+    a, p, ok = _pairs(actual, predicted)
+    row = _grouped(np.zeros(int(ok.sum()), dtype=np.int64), 1, a[ok], p[ok])[0]
+    return dict({"n": row["n"], "coverage": row["n"] / float(expected_slots)}, **row)
+
+
+def breakdown(actual, predicted, bins, labels, key):
+    """
+    Metrics per group: [{key: label, "n", "mae", ...}] for every label,
+    where bins[i] is the label index of pair i (negative to leave it out).
+    """
+    a, p, ok = _pairs(actual, predicted)
+    bins = np.asarray(bins, dtype=np.int64)
+    ok &= bins >= 0
+    rows = _grouped(bins[ok], len(labels), a[ok], p[ok])
+    return [dict({key: label}, **row) for label, row in zip(labels, rows)]
+
+
+def by_hour(actual, predicted, local_times):
+    """Breakdown by hour of day; times are Brisbane wall clock read as UTC epoch seconds."""
+    hours = (np.asarray(local_times, dtype=np.int64) % 86400) // 3600
+    return breakdown(actual, predicted, hours, list(range(24)), "hour")
+
+
+def by_speed_band(actual, predicted):
+    """Breakdown by the observed speed's band (SPEED_BANDS, knots)."""
+    a = np.asarray(actual, dtype=np.float64)
+    bands = np.searchsorted(SPEED_BANDS, np.nan_to_num(a, nan=-1.0), side="right") - 1
+    labels = [f"{lo}-{hi}" for lo, hi in zip(SPEED_BANDS, SPEED_BANDS[1:])] + [f"{SPEED_BANDS[-1]}+"]
+    return breakdown(actual, predicted, bands, labels, "band")
+
+
+def by_sector(actual, predicted, direction):
+    """Breakdown by the observed direction's compass sector; no direction leaves a pair out."""
+    d = np.asarray(direction, dtype=np.float64)
+    width = 360.0 / len(SECTORS)
+    sectors = np.where(np.isfinite(d), ((np.nan_to_num(d) + width / 2) % 360) // width, -1)
+    return breakdown(actual, predicted, sectors, list(SECTORS), "sector")
+
+
+def _pairs(actual, predicted):
+    a = np.asarray(actual, dtype=np.float64)      # None becomes NaN
+    p = np.asarray(predicted, dtype=np.float64)
+    return a, p, np.isfinite(a) & np.isfinite(p)
+
+
+def _grouped(bins, nbins, a, p):
+    """Metric dicts for groups 0..nbins-1 from one bincount per summed quantity."""
+    err = p - a
+    abs_err = np.abs(err)
+    n = np.bincount(bins, minlength=nbins)
+    sums = {
+        "mae": np.bincount(bins, abs_err, nbins),
+        "rmse": np.bincount(bins, err * err, nbins),
+        "bias": np.bincount(bins, err, nbins),
+        "smape": np.bincount(bins, 2 * abs_err / (np.abs(a) + np.abs(p) + EPS), nbins),
+        "mean_actual": np.bincount(bins, a, nbins),
+        "mean_predicted": np.bincount(bins, p, nbins),
+    }
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = {name: s / n for name, s in sums.items()}
+    means["rmse"] = np.sqrt(means["rmse"])
+
+    rows = []
+    for i in range(nbins):
+        count = int(n[i])
+        row = {"n": count}
+        row.update({name: float(means[name][i]) if count else None for name in METRICS})
+        rows.append(row)
+    return rows
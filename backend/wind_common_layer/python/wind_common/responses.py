@@ -0,0 +1,118 @@
+"""
+API Gateway proxy responses shared by the API Lambdas.
+
+Keeps the CORS/JSON headers in one place and compresses bodies above
+MIN_COMPRESS bytes with brotli or gzip, whichever the client accepts
+(brotli only when the module is installed). Compressed bodies go back
+base64 encoded with isBase64Encoded, which API Gateway turns into bytes.
+
+Cacheable responses carry a weak ETag of the JSON text and a
+Cache-Control max-age; a matching If-None-Match gets an empty 304.
+"""
+import base64, gzip, hashlib, json, time
+from email.utils import formatdate
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_COMPRESS = 1024   # bytes; smaller bodies are not worth the CPU
+
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "GET,OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type",
+}
+
+
+def respond(event, body, status=200, headers=None, max_age=None, last_modified=None):
+    """
+    Proxy response for `body` (dict/list, or an already serialised str).
+    max_age (seconds) makes it cacheable; last_modified is an epoch.
+    """
+    text = body if isinstance(body, str) else json.dumps(body)
+    out_headers = dict(CORS_HEADERS)
+    out_headers["Content-Type"] = "application/json"
+    out_headers["Vary"] = "Accept-Encoding"
+
+    if max_age is not None:
+        # weak: the same JSON may go out gzip, brotli or plain
+        etag = 'W/"' + hashlib.sha256(text.encode()).hexdigest()[:32] + '"'
+        out_headers["ETag"] = etag
+        out_headers["Cache-Control"] = f"public, max-age={int(max_age)}"
+        if last_modified is not None:
+            out_headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+        out_headers.update(headers or {})
+        if etag_matches(request_header(event, "If-None-Match"), etag):
+            return {"statusCode": 304, "headers": out_headers, "body": ""}
+    else:
+        out_headers.update(headers or {})
+
+    raw = text.encode()
+    encoding = pick_encoding(request_header(event, "Accept-Encoding")) if len(raw) >= MIN_COMPRESS else None
+    if encoding is None:
+        return {"statusCode": status, "headers": out_headers, "body": text}
+
+    packed = brotli.compress(raw, quality=5) if encoding == "br" else gzip.compress(raw, compresslevel=6)
+    out_headers["Content-Encoding"] = encoding
+    return {
+        "statusCode": status,
+        "headers": out_headers,
+        "body": base64.b64encode(packed).decode(),
+        "isBase64Encoded": True
+    }
+
+
+def error(event, message, status=400):
+    return respond(event, {"error": message}, status=status)
+
+
+def seconds_until_next(step, lag=0, now=None):
+    """
+    Seconds until the next step boundary (plus lag), e.g. step=600, lag=60
+    for data refreshed a minute after every 10-minute observation.
+    """
+    now = time.time() if now is None else now
+    next_refresh = ((now - lag) // step + 1) * step + lag
+    return max(1, int(next_refresh - now))
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith("W/") else tag) == bare:
+            return True
+    return False
+
+
+def request_header(event, name):
+    """Case-insensitive request header lookup ("" when missing)."""
+    for k, v in ((event or {}).get("headers") or {}).items():
+        if k.lower() == name.lower():
+            return v or ""
+    return ""
+
+
+def pick_encoding(accept_encoding):
+    accepted = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if token:
+            accepted[token.lower()] = q
+    if brotli and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
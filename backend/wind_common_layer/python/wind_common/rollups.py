@@ -0,0 +1,107 @@
+"""
+Monthly and yearly rollups of the daily forecast-vs-actual analysis files.
+
+GCmonth2025-10.json / GCyear2025.json hold the period's 10 min rows plus
+hourly and daily aggregates, so long range queries read a handful of
+objects instead of one per day. plan() splits a date range into the
+coarsest pieces that have a closed (no longer changing) rollup.
+"""
+import datetime
+from wind_common import scatter
+
+TIERS = ("year", "month")
+
+
+def rollup_key(station, tier, period):
+    return f"{station}{tier}{period}.json"
+
+
+def periods_for(day):
+    """[(tier, period)] rollups that contain `day`."""
+    return [("year", f"{day.year}"), ("month", day.strftime("%Y-%m"))]
+
+
+def update(rollup, date_str, rows, station, unit, tier, period, now):
+    """Replace one day's rows in a rollup (or start a new one) and refresh aggregates."""
+    return update_days(rollup, {date_str: rows}, station, unit, tier, period, now)
+
+
+def update_days(rollup, days, station, unit, tier, period, now):
+    """update() for several {date_str: rows} at once, aggregating only once."""
+    if rollup is None:
+        rollup = {"metadata": {"station": station, "unit": unit, "tier": tier, "period": period, "dates": []}, "data": []}
+
+    data = [r for r in rollup["data"] if r["time"][:10] not in days]
+    for rows in days.values():
+        data.extend(rows)
+    data.sort(key=lambda r: r["time"])
+
+    dates = set(rollup["metadata"].get("dates", []))
+    dates.update(days)
+
+    rollup["data"] = data
+    rollup["hourly"] = aggregate(data, "hour")
+    rollup["daily"] = aggregate(data, "day")
+    rollup["scatter"] = scatter.histogram(data)
+    rollup["metadata"]["dates"] = sorted(dates)
+    rollup["metadata"]["updated_at"] = now.isoformat()
+    return rollup
+
+
+def aggregate(rows, resolution):
+    """
+    Mean/min/max of actual and predicted per hour or per day.
+    Rows are {"time": iso, "actual", "predicted"}; the bucket is a prefix of time.
+    """
+    width = 13 if resolution == "hour" else 10   # "2025-10-09T10" / "2025-10-09"
+    buckets = {}
+    for r in rows:
+        buckets.setdefault(r["time"][:width], []).append(r)
+
+    out = []
+    for label in sorted(buckets):
+        group = buckets[label]
+        actual = [r["actual"] for r in group if isinstance(r.get("actual"), (int, float))]
+        predicted = [r["predicted"] for r in group if isinstance(r.get("predicted"), (int, float))]
+        out.append({
+            # hour keeps the ISO form with offset: 2025-10-09T10:00:00+10:00
+            "time": label + ":00:00" + group[0]["time"][19:] if resolution == "hour" else label,
+            "n": len(group),
+            "actual": sum(actual) / len(actual) if actual else None,
+            "predicted": sum(predicted) / len(predicted) if predicted else None,
+            "min_actual": min(actual) if actual else None,
+            "max_actual": max(actual) if actual else None,
+            "min_predicted": min(predicted) if predicted else None,
+            "max_predicted": max(predicted) if predicted else None,
+        })
+    return out
+
+
+def plan(start, end, today):
+    """
+    Split [start, end] into [(tier, period, first, last)] pieces: whole
+    years, then whole months, then single-day runs ("days", None, ...).
+    A rollup is only used once its period is closed, i.e. ended before
+    yesterday, whose analysis is written shortly after midnight.
+    """
+    closed_before = today - datetime.timedelta(days=1)
+    pieces = []
+    d = start
+    while d <= end:
+        year_end = datetime.date(d.year, 12, 31)
+        if d.month == 1 and d.day == 1 and year_end <= end and year_end < closed_before:
+            pieces.append(("year", f"{d.year}", d, year_end))
+            d = year_end + datetime.timedelta(days=1)
+            continue
+
+        next_month = (d.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+        month_end = next_month - datetime.timedelta(days=1)
+        if d.day == 1 and month_end <= end and month_end < closed_before:
+            pieces.append(("month", d.strftime("%Y-%m"), d, month_end))
+            d = next_month
+            continue
+
+        last = min(end, month_end)
+        pieces.append(("days", None, d, last))
+        d = last + datetime.timedelta(days=1)
+    return pieces
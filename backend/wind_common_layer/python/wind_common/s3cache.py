@@ -0,0 +1,145 @@
+"""
+Read-through cache for JSON objects in S3.
+
+Two tiers: an in-process LRU bounded by bytes, and a size-bounded folder in
+/tmp that survives between warm invocations of the same container. Objects
+whose current ETag the caller already knows (from a manifest) are served
+straight from the cache when the cached copy has that ETag; anything else
+that may still change is revalidated with If-None-Match.
+
+Readers that need only a small part of a large object (the stored scatter
+histogram of a day file) pass `paths`: the body is streamed through
+jsonstream.load_paths and only that part is cached, under its own entry.
+
+The memory tier holds parsed objects, which take several times their JSON
+size (a day of {"x", "y"} points is ~7x its text), so entries
+are charged PARSED_FACTOR x their raw size against a budget that defaults
+to a quarter of the function's memory.
+"""
+import hashlib, json, os, threading
+from collections import OrderedDict
+from botocore.exceptions import ClientError
+from wind_common import jsonstream, s3util
+
+PARSED_FACTOR = 8
+MEMORY_SHARE = 4   # default budget is 1/MEMORY_SHARE of the function's memory
+
+
+def default_memory_bytes():
+    function_mb = int(os.environ.get("AWS_LAMBDA_FUNCTION_MEMORY_SIZE", 256))
+    return function_mb * 2**20 // MEMORY_SHARE
+
+
+class ObjectCache:
+    def __init__(self, s3_client, memory_bytes=None,
+                 disk_dir="/tmp/s3cache", disk_bytes=256 * 2**20):
+        self.s3 = s3_client
+        self.memory_bytes = default_memory_bytes() if memory_bytes is None else memory_bytes
+        self.disk_dir = disk_dir
+        self.disk_bytes = disk_bytes
+        self._lru = OrderedDict()     # (bucket, key) -> (etag, value, estimated parsed size)
+        self._used = 0
+        self._lock = threading.Lock()
+        os.makedirs(disk_dir, exist_ok=True)
+
+    def get_json(self, bucket, key, mutable=False, etag=None, paths=None):
+        """
+        Parsed JSON of bucket/key. With mutable=True the cached copy is
+        checked against S3 with If-None-Match instead of trusted outright.
+        With an expected `etag` it is trusted only if it has that ETag.
+        With `paths` only those parts of the document are read and kept.
+        """
+        slot = key if paths is None else f"{key}#{'|'.join(paths)}"   # cache entry name
+        cached = self._from_memory(bucket, slot) or self._from_disk(bucket, slot)
+        if cached and (cached[0] == etag if etag else not mutable):
+            return cached[1]
+
+        params = {"Bucket": bucket, "Key": key}
+        if cached:
+            params["IfNoneMatch"] = cached[0]
+        try:
+            obj = self.s3.get_object(**params)
+        except ClientError as e:
+            if cached and s3util.error_code(e) in ("304", "NotModified"):
+                return cached[1]
+            raise
+
+        if paths is None:
+            body = obj["Body"].read()
+            value = json.loads(body)
+        else:
+            value = jsonstream.load_paths(obj["Body"], paths)
+            body = json.dumps(value).encode()
+        etag = obj["ETag"]
+        self._to_memory(bucket, slot, etag, value, len(body))
+        self._to_disk(bucket, slot, etag, body)
+        return value
+
+    # memory tier
+    def _from_memory(self, bucket, key):
+        with self._lock:
+            hit = self._lru.get((bucket, key))
+            if hit:
+                self._lru.move_to_end((bucket, key))
+                return hit[0], hit[1]
+        return None
+
+    def _to_memory(self, bucket, key, etag, value, raw_size):
+        size = raw_size * PARSED_FACTOR
+        if size > self.memory_bytes:
+            return
+        with self._lock:
+            old = self._lru.pop((bucket, key), None)
+            if old:
+                self._used -= old[2]
+            self._lru[(bucket, key)] = (etag, value, size)
+            self._used += size
+            while self._used > self.memory_bytes:
+                _, (_, _, evicted) = self._lru.popitem(last=False)
+                self._used -= evicted
+
+    # disk tier: <dir>/<sha1>.json holding {"etag", "body"}
+    def _path(self, bucket, key):
+        return os.path.join(self.disk_dir, hashlib.sha1(f"{bucket}/{key}".encode()).hexdigest() + ".json")
+
+    def _from_disk(self, bucket, key):
+        path = self._path(bucket, key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        os.utime(path)   # mtime doubles as last-used for eviction
+        value = json.loads(entry["body"])
+        self._to_memory(bucket, key, entry["etag"], value, len(entry["body"]))
+        return entry["etag"], value
+
+    def _to_disk(self, bucket, key, etag, body):
+        if len(body) > self.disk_bytes:
+            return
+        path = self._path(bucket, key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump({"etag": etag, "body": body.decode()}, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"disk cache write failed for {key}: {e}")
+            return
+        self._trim_disk()
+
+    def _trim_disk(self):
+        entries = []
+        for e in os.scandir(self.disk_dir):
+            if e.name.endswith(".json"):
+                st = e.stat()
+                entries.append((st.st_mtime, st.st_size, e.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
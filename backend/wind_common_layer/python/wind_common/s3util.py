@@ -0,0 +1,103 @@
+"""
+S3 plumbing shared by the handlers and the wind_common writers.
+
+list_dated() walks a station's <prefix>YYYY-MM-DD.json objects between two
+dates without listing the rest of the bucket: the listing prefix narrows to
+the digits both dates share, starts just before the first day and stops at
+the first key past the last one.
+
+update_json() is the read-modify-write used for manifests and metric
+partitions: GET with the ETag, PUT under If-Match (If-None-Match when the
+object is new) and start over on a conflict.
+"""
+import datetime, json, os
+from botocore.exceptions import ClientError
+
+RETRIES = 5
+CONFLICT = ("PreconditionFailed", "ConditionalRequestConflict")
+MISSING = ("404", "NoSuchKey", "NotFound")
+
+
+def error_code(e):
+    return e.response.get("Error", {}).get("Code")
+
+
+def is_date(s):
+    """True for a YYYY-MM-DD string."""
+    try:
+        datetime.date.fromisoformat(s)
+        return len(s) == 10
+    except ValueError:
+        return False
+
+
+def list_dated(s3_client, bucket, prefix, start=None, end=None, suffix=".json"):
+    """
+    Yield (date_str, object summary) for <prefix>YYYY-MM-DD<suffix> keys in
+    [start, end] in date order; either end may be None for an open range.
+    Other keys under the prefix (manifests, rollups) are skipped.
+    """
+    kwargs = {"Bucket": bucket, "Prefix": prefix}
+    if start and end:
+        kwargs["Prefix"] += os.path.commonprefix([str(start), str(end)])
+    if start:
+        kwargs["StartAfter"] = f"{prefix}{start}"   # sorts just before <prefix><start><suffix>
+    stop_after = f"{prefix}{end or '9999-12-31'}{suffix}"
+
+    for page in s3_client.get_paginator("list_objects_v2").paginate(**kwargs):
+        for obj in page.get("Contents", []):
+            key = obj["Key"]
+            if key > stop_after:
+                return
+            date_str = key[len(prefix):-len(suffix)]
+            if key.endswith(suffix) and is_date(date_str):
+                yield date_str, obj
+
+
+def load_json(s3_client, bucket, key):
+    """(document, etag), or (None, None) when the object does not exist."""
+    try:
+        obj = s3_client.get_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if error_code(e) in MISSING:
+            return None, None
+        raise
+    return json.loads(obj["Body"].read()), obj["ETag"]
+
+
+def put_json(s3_client, bucket, key, doc, etag=None):
+    """
+    Write `doc` only if the object still has `etag` (or, with no etag,
+    still does not exist). False when someone else got there first.
+    """
+    condition = {"IfMatch": etag} if etag else {"IfNoneMatch": "*"}
+    try:
+        s3_client.put_object(
+            Bucket=bucket,
+            Key=key,
+            Body=json.dumps(doc),
+            ContentType="application/json",
+            **condition
+        )
+        return True
+    except ClientError as e:
+        if error_code(e) not in CONFLICT:
+            raise
+        return False
+
+
+def update_json(s3_client, bucket, key, update, retries=RETRIES):
+    """
+    Read-modify-write bucket/key. update(doc or None) returns the document
+    to write, or None to leave the object alone; after a conflict it runs
+    again on a fresh copy. Returns what is stored. Raises after `retries`
+    conflicts.
+    """
+    for _ in range(retries):
+        current, etag = load_json(s3_client, bucket, key)
+        doc = update(current)
+        if doc is None:
+            return current
+        if put_json(s3_client, bucket, key, doc, etag):
+            return doc
+    raise RuntimeError(f"gave up writing {bucket}/{key} after {retries} conflicts")
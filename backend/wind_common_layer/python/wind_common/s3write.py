@@ -0,0 +1,53 @@
+"""
+S3 writes that skip a PUT when the object already holds the same bytes.
+
+Each body's SHA-256 is stored in the object's metadata. Before writing,
+the new hash is compared with a HEAD of the object. A HEAD is far cheaper
+than a PUT, and skipping keeps ETags stable, so the manifests and cached
+copies that depend on them are not invalidated when nothing changed.
+
+The hash this container last wrote only saves the HEAD when the new body
+differs from it; a match is still checked against S3, since another
+writer (or a deleted object) may have changed it since.
+"""
+import hashlib
+from botocore.exceptions import ClientError
+from wind_common import s3util
+
+HASH_META = "sha256"
+
+# (bucket, key) -> hash last written or seen by this container; never trusted to skip a PUT
+_known = {}
+
+
+def content_hash(body):
+    return hashlib.sha256(body.encode() if isinstance(body, str) else body).hexdigest()
+
+
+def put_if_changed(s3_client, bucket, key, body, **kwargs):
+    """
+    put_object unless the stored object has the same content hash.
+    Returns the put_object response, or None when the write was skipped.
+    """
+    digest = content_hash(body)
+    known = _known.get((bucket, key))
+    # a body that differs from our last write almost certainly differs from S3 too
+    if (known is None or known == digest) and stored_hash(s3_client, bucket, key) == digest:
+        _known[(bucket, key)] = digest
+        return None
+
+    metadata = dict(kwargs.pop("Metadata", None) or {}, **{HASH_META: digest})
+    resp = s3_client.put_object(Bucket=bucket, Key=key, Body=body, Metadata=metadata, **kwargs)
+    _known[(bucket, key)] = digest
+    return resp
+
+
+def stored_hash(s3_client, bucket, key):
+    """Content hash in the object's metadata; None if missing or written without one."""
+    try:
+        head = s3_client.head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if s3util.error_code(e) in s3util.MISSING:
+            return None
+        raise
+    return head.get("Metadata", {}).get(HASH_META)
@@ -0,0 +1,81 @@
+"""
+Actual-vs-predicted scatter data that stays the same size for any range.
+
+histogram() bins (actual, predicted) pairs on a fixed 1 knot grid and is
+stored with every day file and rollup; histograms of several days merge
+by adding counts. stratified_sample() keeps at most n pairs, spread over
+the histogram cells in proportion to their counts, with one reservoir per
+cell so the rows can be streamed once.
+"""
+import random
+
+BIN_SIZE = 1.0    # knots
+MAX_BIN = 40      # everything from 40 kn up shares the last bin
+
+
+def cell(actual, predicted):
+    return (min(int(actual // BIN_SIZE), MAX_BIN), min(int(predicted // BIN_SIZE), MAX_BIN))
+
+
+def pairs(rows):
+    for r in rows:
+        a, p = r.get("actual"), r.get("predicted")
+        if isinstance(a, (int, float)) and isinstance(p, (int, float)) and a >= 0 and p >= 0:
+            yield r, a, p
+
+
+def histogram(rows):
+    """Sparse 2D histogram: {"bin_size", "max_bin", "counts": [[i, j, count], ...]}."""
+    counts = {}
+    for _, a, p in pairs(rows):
+        c = cell(a, p)
+        counts[c] = counts.get(c, 0) + 1
+    return _pack(counts)
+
+
+def merge(hists):
+    counts = {}
+    for h in hists:
+        for i, j, n in h.get("counts", []):
+            counts[(i, j)] = counts.get((i, j), 0) + n
+    return _pack(counts)
+
+
+def stratified_sample(rows, hist, n, seed=0):
+    """
+    Up to n rows, each histogram cell getting a share proportional to its
+    count (at least one). `rows` can be any iterable and is read once.
+    """
+    total = sum(c for _, _, c in hist.get("counts", []))
+    if total == 0:
+        return []
+    quota = {(i, j): max(1, round(n * c / total)) for i, j, c in hist["counts"]}
+
+    rng = random.Random(seed)
+    reservoirs, seen = {}, {}
+    for r, a, p in pairs(rows):
+        c = cell(a, p)
+        k = quota.get(c, 1)
+        seen[c] = seen.get(c, 0) + 1
+        res = reservoirs.setdefault(c, [])
+        if len(res) < k:
+            res.append(r)
+        else:
+            j = rng.randrange(seen[c])
+            if j < k:
+                res[j] = r
+
+    sample = [r for res in reservoirs.values() for r in res]
+    if len(sample) > n:
+        # the one-per-cell minimum can overshoot n slightly
+        sample = rng.sample(sample, n)
+    sample.sort(key=lambda r: r["time"])
+    return sample
+
+
+def _pack(counts):
+    return {
+        "bin_size": BIN_SIZE,
+        "max_bin": MAX_BIN,
+        "counts": [[i, j, n] for (i, j), n in sorted(counts.items())]
+    }
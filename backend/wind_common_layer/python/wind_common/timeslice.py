@@ -0,0 +1,42 @@
+"""
+Time-window slicing for WillyWeather observation points.
+
+Points come back sorted by "x" (epoch seconds), so a window is found with
+two binary searches instead of converting every point to a datetime.
+WillyWeather stamps Brisbane local time as if it were UTC, so naive window
+bounds are converted as UTC too.
+"""
+import datetime
+from bisect import bisect_left
+
+
+def to_epoch(dt):
+    """Epoch seconds for `dt`; naive datetimes are read as UTC."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.timestamp()
+
+
+def day_window(day):
+    """[start, end) epoch bounds of a Brisbane calendar day in WW's x scale."""
+    start = datetime.datetime(day.year, day.month, day.day)
+    return to_epoch(start), to_epoch(start + datetime.timedelta(days=1))
+
+
+def slice_points(points, lo, hi):
+    """Points with lo <= x < hi, from a list sorted by x."""
+    i = bisect_left(points, lo, key=_x)
+    j = bisect_left(points, hi, lo=i, key=_x)
+    return points[i:j]
+
+
+def slice_observations(data, lo, hi):
+    """Trim every group of every observational graph in place to [lo, hi)."""
+    for graph in data.get("observationalGraphs", {}).values():
+        for group in graph.get("dataConfig", {}).get("series", {}).get("groups", []):
+            group["points"] = slice_points(group.get("points", []), lo, hi)
+    return data
+
+
+def _x(pt):
+    return pt["x"]
@@ -0,0 +1,74 @@
+"""
+Columnar response format shared by the API endpoints (format=columnar).
+
+    {
+      "metadata": {...same as the row format...},
+      "format": "columnar", "version": 1, "tz": "Australia/Brisbane",
+      "start": 1759960800,          # UTC epoch seconds of the first row
+      "step": 600,                  # seconds between rows when regular
+      "offsets": [0, 600, 1800],    # only when irregular (then step is null)
+      "columns": {
+        "actual": {"scale": 100, "values": [392, 405, null]},   # 0.01 units
+        "direction_text": {"values": ["N", "NNE", "N"]}
+      }
+    }
+
+Numbers are integers in hundredths (value = int / scale); strings and
+anything else are passed through unchanged.
+"""
+import datetime
+from zoneinfo import ZoneInfo
+
+VERSION = 1
+SCALE = 100
+TZ = ZoneInfo("Australia/Brisbane")
+
+
+def wants_columnar(params):
+    return (params or {}).get("format") == "columnar"
+
+
+def columnar(metadata, columns, times=None):
+    """Build the columnar document; `times` are UTC epoch seconds (or None)."""
+    doc = {"metadata": metadata, "format": "columnar", "version": VERSION, "tz": str(TZ)}
+    if times:
+        times = [int(round(t)) for t in times]
+        diffs = {b - a for a, b in zip(times, times[1:])}
+        doc["start"] = times[0]
+        doc["step"] = diffs.pop() if len(diffs) == 1 else (None if diffs else 0)
+        if doc["step"] is None:
+            doc["offsets"] = [t - times[0] for t in times]
+    doc["columns"] = {name: _column(values) for name, values in columns.items()}
+    return doc
+
+
+def rows_to_columnar(metadata, rows, time_key="time"):
+    """Row-format data ([{time_key: iso, ...}]) as a columnar document."""
+    names = []
+    for r in rows:
+        for k in r:
+            if k != time_key and k not in names:
+                names.append(k)
+    times = [to_epoch(r[time_key]) for r in rows] if rows and time_key in rows[0] else None
+    columns = {name: [r.get(name) for r in rows] for name in names}
+    return columnar(metadata, columns, times)
+
+
+def to_epoch(value):
+    """UTC epoch of an ISO date/datetime; naive values are Brisbane time."""
+    dt = datetime.datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=TZ)
+    return dt.timestamp()
+
+
+def local_to_epoch(local_seconds):
+    """UTC epoch of a WillyWeather-style Brisbane-wall-clock-as-UTC timestamp."""
+    return datetime.datetime.utcfromtimestamp(local_seconds).replace(tzinfo=TZ).timestamp()
+
+
+def _column(values):
+    numeric = [v for v in values if v is not None]
+    if numeric and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in numeric):
+        return {"scale": SCALE, "values": [None if v is None else int(round(v * SCALE)) for v in values]}
+    return {"values": list(values)}
@@ -7,6 +7,9 @@ resource "aws_api_gateway_rest_api" "my_api" {
   endpoint_configuration {
     types = ["REGIONAL"]
   }
+
+  # lets the Lambdas return gzip/brotli bodies base64 encoded
+  binary_media_types = ["*/*"]
 }
 
 resource "aws_api_gateway_resource" "submit" {
@@ -63,6 +66,8 @@ resource "aws_api_gateway_integration" "submit_options_integration" {
   resource_id = aws_api_gateway_resource.submit.id
   http_method = aws_api_gateway_method.submit_options.http_method
   type        = "MOCK"
+  # binary_media_types is */*, so turn the preflight back into text for the template
+  content_handling = "CONVERT_TO_TEXT"
 
   request_templates = {
     "application/json" = "{ \"statusCode\": 200 }"
@@ -262,6 +267,8 @@ resource "aws_api_gateway_integration" "forecast_options_integration" {
   resource_id = aws_api_gateway_resource.forecast.id
   http_method = aws_api_gateway_method.forecast_options.http_method
   type        = "MOCK"
+  # binary_media_types is */*, so turn the preflight back into text for the template
+  content_handling = "CONVERT_TO_TEXT"
 
   request_templates = {
     "application/json" = "{ \"statusCode\": 200 }"
@@ -383,6 +390,8 @@ resource "aws_api_gateway_integration" "analysis_options_integration" {
   resource_id = aws_api_gateway_resource.analysis.id
   http_method = aws_api_gateway_method.analysis_options.http_method
   type        = "MOCK"
+  # binary_media_types is */*, so turn the preflight back into text for the template
+  content_handling = "CONVERT_TO_TEXT"
   request_templates = {
     "application/json" = "{ \"statusCode\": 200 }"
   }
@@ -42,3 +42,26 @@ resource "aws_lambda_permission" "allow_eventbridge_analysis_builder" {
   principal     = "events.amazonaws.com"
   source_arn    = aws_cloudwatch_event_rule.analysis_builder_daily.arn
 }
+
+
+
+resource "aws_cloudwatch_event_rule" "current_wind_ingest" {
+  name                = "current-wind-ingest"
+  schedule_expression = "cron(1/10 * * * ? *)" # a minute after each 10-min observation
+  description         = "Refresh the current_wind snapshot every 10 minutes"
+}
+
+resource "aws_cloudwatch_event_target" "current_wind_ingest" {
+  rule      = aws_cloudwatch_event_rule.current_wind_ingest.name
+  target_id = "current-wind-lambda"
+  arn       = aws_lambda_function.lambda1.arn
+  input     = jsonencode({ mode = "ingest" })
+}
+
+resource "aws_lambda_permission" "allow_eventbridge_current_wind" {
+  statement_id  = "AllowEventBridgeInvokeCurrentWind"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.lambda1.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.current_wind_ingest.arn
+}
@@ -13,6 +13,7 @@ resource "aws_lambda_function" "analysis_wind" {
   handler          = "index.lambda_handler"     
   runtime          = "python3.12"
   source_code_hash = data.archive_file.analysis_wind.output_base64sha256
+  layers           = [aws_lambda_layer_version.wind_common.arn, var.numpy_layer_arn]
 
 
   timeout      = 30     # seconds 
@@ -13,10 +13,11 @@ resource "aws_lambda_function" "analysis_builder" {
   handler          = "index.lambda_handler"     
   runtime          = "python3.12"
   source_code_hash = data.archive_file.analysis_builder.output_base64sha256
+  layers           = [aws_lambda_layer_version.wind_common.arn, var.numpy_layer_arn]
 
 
-  timeout      = 30     # seconds 
-  memory_size  = 256    
+  timeout      = 900    # seconds; daily runs take a few, rebuild mode uses the rest
+  memory_size  = 3538   # two full vCPUs (one per 1769 MB) for rebuild's worker processes
 
   environment {
     variables = {
@@ -0,0 +1,21 @@
+# NumPy is not vendored into the function folders, it comes from a
+# prebuilt layer (e.g. the AWS managed AWSSDKPandas-Python312 layer)
+variable "numpy_layer_arn" {
+  type        = string
+  description = "ARN of a python3.12 layer that provides NumPy"
+}
+
+# --- Shared python code (backend/wind_common_layer/python/wind_common) ---
+data "archive_file" "wind_common" {
+  type        = "zip"
+  source_dir  = "${path.module}/../backend/wind_common_layer/"
+  output_path = "${path.module}/../backend/wind_common_layer.zip"
+  excludes    = ["README.md"]
+}
+
+resource "aws_lambda_layer_version" "wind_common" {
+  filename            = "${path.module}/../backend/wind_common_layer.zip"
+  layer_name          = "wind_common"
+  compatible_runtimes = ["python3.12"]
+  source_code_hash    = data.archive_file.wind_common.output_base64sha256
+}
@@ -13,8 +13,9 @@ resource "aws_lambda_function" "record_wind" {
   handler          = "index.lambda_handler"     # keep same naming convention
   runtime          = "python3.12"
   source_code_hash = data.archive_file.record_wind.output_base64sha256
+  layers           = [aws_lambda_layer_version.wind_common.arn, var.numpy_layer_arn]
 
-  timeout      = 30     # seconds 
+  timeout      = 300    # seconds, backfill runs need the headroom
   memory_size  = 256    
 
   environment {
@@ -38,6 +39,27 @@ data "aws_iam_policy_document" "record_wind_s3" {
   }
 }
 
+# backfill checks which days already exist and keeps a checkpoint
+data "aws_iam_policy_document" "record_wind_s3_read" {
+  statement {
+    effect = "Allow"
+    actions = [
+      "s3:GetObject",
+      "s3:ListBucket"
+    ]
+    resources = [
+      aws_s3_bucket.record_wind.arn,
+      "${aws_s3_bucket.record_wind.arn}/*"
+    ]
+  }
+}
+
+resource "aws_iam_role_policy" "record_wind_s3_read" {
+  name   = "record-wind-s3-read"
+  role   = aws_iam_role.iam_for_lambda.id
+  policy = data.aws_iam_policy_document.record_wind_s3_read.json
+}
+
 resource "aws_iam_role_policy" "record_wind_s3" {
   name   = "record-wind-s3-access"
   role   = aws_iam_role.iam_for_lambda.id
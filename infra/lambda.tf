@@ -53,6 +53,12 @@ resource "aws_lambda_function" "lambda1" {
   runtime         = "python3.12"
 
   source_code_hash = data.archive_file.lambda1.output_base64sha256
+  layers           = [aws_lambda_layer_version.wind_common.arn, var.numpy_layer_arn]
+
+  # the scheduled ingest (and an inline refresh of a stale snapshot) calls
+  # WillyWeather, writes record/analysis/manifest/snapshot objects and imports NumPy
+  timeout     = 30    # seconds
+  memory_size = 512
 
 #   lifecycle {
 #   ignore_changes = [filename, source_code_hash]
@@ -72,6 +78,7 @@ resource "aws_lambda_function" "forecast_lambda" {
   handler          = "index.lambda_handler"
   runtime          = "python3.12"
   source_code_hash = data.archive_file.forecast_lambda.output_base64sha256
+  layers           = [aws_lambda_layer_version.wind_common.arn, var.numpy_layer_arn]
   environment {
     variables = {
       WW_API_KEY = var.ww_api_key
@@ -91,13 +98,16 @@ resource "aws_lambda_permission" "allow_api_gateway_forecast" {
 
 
 
+# ListBucket so a HEAD of a missing key is a 404, not a 403 (skip-unchanged writes)
 data "aws_iam_policy_document" "forecast_lambda_s3_read" {
   statement {
     effect = "Allow"
     actions = [
-      "s3:GetObject"
+      "s3:GetObject",
+      "s3:ListBucket"
     ]
     resources = [
+      aws_s3_bucket.forecast_wind.arn,
       "${aws_s3_bucket.forecast_wind.arn}/*"
     ]
   }
@@ -130,6 +140,29 @@ resource "aws_iam_role_policy" "record_wind_s3_write" {
   policy = data.aws_iam_policy_document.record_wind_s3_write.json
 }
 
+# current_wind snapshot served to /submit and its refresh lease
+data "aws_iam_policy_document" "current_wind_s3" {
+  statement {
+    effect = "Allow"
+    actions = [
+      "s3:GetObject",
+      "s3:PutObject",
+      "s3:DeleteObject",
+      "s3:ListBucket"
+    ]
+    resources = [
+      aws_s3_bucket.current_wind.arn,
+      "${aws_s3_bucket.current_wind.arn}/*"
+    ]
+  }
+}
+
+resource "aws_iam_role_policy" "current_wind_s3" {
+  name   = "current-wind-s3"
+  role   = aws_iam_role.iam_for_lambda.id
+  policy = data.aws_iam_policy_document.current_wind_s3.json
+}
+
 
 
 
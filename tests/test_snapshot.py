@@ -0,0 +1,126 @@
+"""
+SnapshotCache against an in-memory S3 stand-in and a fake clock.
+
+Run from the repository root:  python -m unittest discover tests
+"""
+import hashlib, io, json, os, sys, unittest
+
+try:
+    from botocore.exceptions import ClientError
+except ImportError:   # botocore ships with the Lambda runtime, not necessarily locally
+    ClientError = None
+
+BACKEND = os.path.join(os.path.dirname(__file__), "..", "backend")
+sys.path.insert(0, os.path.join(BACKEND, "current_wind"))
+sys.path.insert(0, os.path.join(BACKEND, "wind_common_layer", "python"))
+
+
+class FakeS3:
+    """Just enough of the S3 client for SnapshotCache, including conditional writes."""
+
+    def __init__(self):
+        self.objects = {}   # key -> (body bytes, etag, metadata)
+        self.gets = 0
+
+    def _error(self, code):
+        raise ClientError({"Error": {"Code": code}}, "FakeS3")
+
+    def _check(self, key, if_match=None, if_none_match=None):
+        current = self.objects.get(key)
+        if if_none_match == "*" and current:
+            self._error("PreconditionFailed")
+        if if_match is not None and (not current or current[1] != if_match):
+            self._error("PreconditionFailed")
+
+    def put_object(self, Bucket, Key, Body, IfMatch=None, IfNoneMatch=None, Metadata=None, **kwargs):
+        self._check(Key, IfMatch, IfNoneMatch)
+        body = Body.encode() if isinstance(Body, str) else Body
+        etag = '"%s"' % hashlib.md5(body + str(len(self.objects)).encode()).hexdigest()
+        self.objects[Key] = (body, etag, Metadata or {})
+        return {"ETag": etag}
+
+    def get_object(self, Bucket, Key):
+        self.gets += 1
+        if Key not in self.objects:
+            self._error("NoSuchKey")
+        body, etag, metadata = self.objects[Key]
+        return {"Body": io.BytesIO(body), "ETag": etag, "Metadata": metadata}
+
+    def delete_object(self, Bucket, Key, IfMatch=None):
+        if Key not in self.objects:
+            self._error("NoSuchKey")
+        self._check(Key, if_match=IfMatch)
+        del self.objects[Key]
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@unittest.skipIf(ClientError is None, "botocore is not installed")
+class SnapshotCacheTest(unittest.TestCase):
+    def setUp(self):
+        from snapshot import SnapshotCache
+        self.s3 = FakeS3()
+        self.clock = Clock()
+        self.refreshes = 0
+
+        def refresh():
+            self.refreshes += 1
+            return json.dumps({"refresh": self.refreshes})
+
+        self.cache = SnapshotCache(self.s3, "current-wind", "GClatest.json", refresh,
+                                   cadence=600, max_age=1200, lease_seconds=60,
+                                   clock=self.clock, lease_key="GClatest.lease")
+
+    def hold_lease(self, expires):
+        self.s3.put_object(Bucket="current-wind", Key="GClatest.lease",
+                           Body=json.dumps({"owner": "other", "expires": expires}))
+
+    def test_serves_from_memory_within_cadence(self):
+        first = self.cache.get()
+        gets = self.s3.gets
+        self.clock.now += 599
+        self.assertEqual(self.cache.get(), first)
+        self.assertEqual(self.refreshes, 1)
+        self.assertEqual(self.s3.gets, gets)   # no S3 round trip at all
+        self.assertNotIn("GClatest.lease", self.s3.objects)
+
+    def test_serves_stale_copy_while_another_invocation_holds_the_lease(self):
+        self.cache.publish(json.dumps({"old": True}))
+        self.clock.now += 1300   # past max_age
+        self.hold_lease(expires=self.clock.now + 30)
+
+        self.assertEqual(json.loads(self.cache.get()), {"old": True})
+        self.assertEqual(self.refreshes, 0)
+        self.assertIn("GClatest.lease", self.s3.objects)   # theirs, left alone
+
+    def test_takes_over_an_expired_lease(self):
+        self.cache.publish(json.dumps({"old": True}))
+        self.clock.now += 1300
+        self.hold_lease(expires=self.clock.now - 1)   # holder died
+
+        self.assertEqual(json.loads(self.cache.get()), {"refresh": 1})
+        self.assertNotIn("GClatest.lease", self.s3.objects)   # released after refreshing
+
+    def test_does_not_release_a_lease_taken_over_by_someone_else(self):
+        self.cache.publish(json.dumps({"old": True}))
+        self.clock.now += 1300
+
+        def slow_refresh():
+            # our lease expires mid-refresh and another invocation takes it over
+            self.s3.put_object(Bucket="current-wind", Key="GClatest.lease",
+                               Body=json.dumps({"owner": "other", "expires": self.clock.now + 60}))
+            return json.dumps({"slow": True})
+
+        self.cache.refresh = slow_refresh
+        self.assertEqual(json.loads(self.cache.get()), {"slow": True})
+        self.assertIn("GClatest.lease", self.s3.objects)
+
+
+if __name__ == "__main__":
+    unittest.main()